@@ -6,11 +6,20 @@ import { Input } from "@/components/ui/input"
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Progress } from "@/components/ui/progress"
 
+interface ProcessedFrame {
+  frame_number: number
+  predicted_class: string
+  confidence: number
+  image: string
+  thumbnail: string
+}
+
 interface DetectionResult {
   status: string
   predicted_class: string
   confidence: number
-  processed_image: string
+  processed_frames: ProcessedFrame[]
+  summary_frame: number | null
   timestamp: string
 }
 
@@ -125,11 +134,25 @@ export default function VideoDetection() {
                     <div className="aspect-video relative bg-gray-100 rounded-lg overflow-hidden">
                       {/* eslint-disable-next-line @next/next/no-img-element */}
                       <img
-                        src={result.processed_image}
+                        src={result.summary_frame !== null ? result.processed_frames[result.summary_frame].image : undefined}
                         alt="Detection Result"
                         className="w-full h-full object-contain"
                       />
                     </div>
+                    <div className="flex gap-1 overflow-x-auto">
+                      {result.processed_frames.map((frame) => (
+                        <a key={frame.frame_number} href={frame.image} target="_blank" rel="noreferrer">
+                          {/* eslint-disable-next-line @next/next/no-img-element */}
+                          <img
+                            src={frame.thumbnail}
+                            alt={`Frame ${frame.frame_number}: ${frame.predicted_class}`}
+                            title={`${frame.predicted_class} (${(frame.confidence * 100).toFixed(1)}%)`}
+                            loading="lazy"
+                            className="h-12 rounded"
+                          />
+                        </a>
+                      ))}
+                    </div>
                     <div className="text-center space-y-2 bg-primary/10 rounded-lg p-4">
                       <p className="text-2xl font-bold text-primary">
                         {result.predicted_class}
@@ -0,0 +1,168 @@
+import os
+import heapq
+import queue
+import shutil
+import logging
+import argparse
+import threading
+import cv2
+import numpy as np
+from typing import Dict, List, Optional
+from live_sessions import frame_hash
+
+logger = logging.getLogger(__name__)
+
+def uncertainty(probabilities: np.ndarray, metric: str = "margin") -> float:
+    """0 for a certain prediction, 1 for a maximally uncertain one"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    if metric == "entropy":
+        entropy = -np.sum(probabilities * np.log(np.clip(probabilities, 1e-12, 1.0)))
+        return float(entropy / np.log(len(probabilities)))
+    top_two = np.partition(probabilities, -2)[-2:]
+    return float(1.0 - (top_two[1] - top_two[0]))
+
+class SampleSelector:
+    """Keeps the most uncertain production frames on disk for labeling
+
+    ``offer`` only scores and enqueues; deduplication, JPEG encoding and disk writes happen
+    on a background thread. The pool is bounded: once full, a new frame only gets in by
+    displacing the least uncertain one. Each file name carries its score, predicted
+    class and perceptual hash, so the pool is rebuilt from the directory on restart.
+    """
+    def __init__(
+        self,
+        directory: str,
+        categories: List[str],
+        capacity: int = 2000,
+        metric: str = "margin",
+        min_score: float = 0.3,
+        queue_size: int = 64
+    ):
+        self.directory = directory
+        self.categories = categories
+        self.capacity = capacity
+        self.metric = metric
+        self.min_score = min_score
+        self.offered = 0
+        self.accepted = 0
+        self.duplicates = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._heap = []  # (score, file name), least uncertain first
+        self._hashes = set()
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            try:
+                score, _, digest = os.path.splitext(name)[0].split("_")
+                self._heap.append((float(score), name))
+                self._hashes.add(digest)
+            except ValueError:
+                continue
+        heapq.heapify(self._heap)
+
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="sample-selector", daemon=True)
+        self._writer.start()
+
+    def _threshold(self) -> float:
+        with self._lock:
+            if len(self._heap) < self.capacity:
+                return self.min_score
+            return max(self.min_score, self._heap[0][0])
+
+    def offer(self, image: np.ndarray, probabilities: np.ndarray) -> bool:
+        """Queue a decoded BGR frame if its own probabilities are uncertain enough to keep it
+
+        The frame is copied only once it qualifies, since callers draw on it afterwards.
+        """
+        self.offered += 1
+        score = uncertainty(probabilities, self.metric)
+        if score <= self._threshold():
+            return False
+        predicted = self.categories[int(np.argmax(probabilities))]
+        try:
+            self._queue.put_nowait((score, predicted, image.copy()))
+        except queue.Full:
+            return False
+        return True
+
+    def close(self):
+        self._stopped.set()
+        self._writer.join()
+
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty()):
+            try:
+                score, predicted, image = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self._store(score, predicted, image)
+            except Exception as e:
+                logger.error(f"Failed to store an active-learning sample: {e}")
+
+    def _store(self, score: float, predicted: str, image: np.ndarray):
+        digest = frame_hash(image).hex()
+        with self._lock:
+            if digest in self._hashes:
+                self.duplicates += 1
+                return
+            if len(self._heap) >= self.capacity and score <= self._heap[0][0]:
+                return
+
+        name = f"{score:.4f}_{predicted}_{digest}.jpg"
+        cv2.imwrite(os.path.join(self.directory, name), image)
+
+        with self._lock:
+            heapq.heappush(self._heap, (score, name))
+            self._hashes.add(digest)
+            self.accepted += 1
+            while len(self._heap) > self.capacity:
+                _, evicted = heapq.heappop(self._heap)
+                self._hashes.discard(os.path.splitext(evicted)[0].split("_")[2])
+                os.remove(os.path.join(self.directory, evicted))
+
+    def export(self, output_dir: str, limit: Optional[int] = None) -> Dict[str, int]:
+        """Copy the most uncertain samples into ``<output_dir>/<predicted class>/``
+
+        This is the folder layout train_model.py and pytorch.py read. Classes are the model's
+        predictions, so reviewers only need to move the misfiled images.
+        """
+        with self._lock:
+            samples = sorted(self._heap, reverse=True)[:limit]
+        counts = {category: 0 for category in self.categories}
+        for category in self.categories:
+            os.makedirs(os.path.join(output_dir, category), exist_ok=True)
+        for _, name in samples:
+            predicted = name.split("_")[1]
+            shutil.copy2(os.path.join(self.directory, name), os.path.join(output_dir, predicted, name))
+            counts[predicted] += 1
+        return counts
+
+    def stats(self) -> Dict:
+        with self._lock:
+            scores = [score for score, _ in self._heap]
+        return {
+            "metric": self.metric,
+            "pool_size": len(scores),
+            "capacity": self.capacity,
+            "min_pool_score": round(min(scores), 4) if scores else None,
+            "offered": self.offered,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates
+        }
+
+if __name__ == "__main__":
+    from model import CATEGORIES
+
+    parser = argparse.ArgumentParser(description="Export the active-learning pool for labeling")
+    parser.add_argument("output", help="Destination in the category-folder dataset layout")
+    parser.add_argument("--pool", default="active_learning")
+    parser.add_argument("--limit", type=int, default=None, help="Export only the N most uncertain samples")
+    args = parser.parse_args()
+
+    selector = SampleSelector(args.pool, CATEGORIES)
+    counts = selector.export(args.output, args.limit)
+    selector.close()
+    print(f"Exported {sum(counts.values())} samples to {args.output}: {counts}")
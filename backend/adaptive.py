@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import argparse
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from typing import Dict, List, Tuple
+from preprocessing import to_input_batch
+
+logger = logging.getLogger(__name__)
+
+# EfficientNet-B4 feature stages after which an exit head is attached (160 and 272 channels)
+DEFAULT_EXIT_STAGES = (5, 6)
+
+def adaptive_resolution_predict(
+    model: nn.Module,
+    batch: torch.Tensor,
+    low_resolution: int,
+    threshold: float
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Classify at a reduced resolution and re-run only low-confidence inputs at full size
+
+    EfficientNet ends in adaptive pooling, so the same weights accept either size.
+    Returns probabilities and a boolean mask of the inputs that were re-run.
+    """
+    small = F.interpolate(batch, size=(low_resolution, low_resolution), mode="bilinear",
+                          align_corners=False, antialias=True)
+    probabilities = torch.softmax(model(small), dim=1)
+    rerun = probabilities.max(dim=1).values < threshold
+    if rerun.any():
+        probabilities[rerun] = torch.softmax(model(batch[rerun]), dim=1)
+    return probabilities, rerun
+
+class EarlyExitEfficientNet(nn.Module):
+    """EfficientNetB4Custom with lightweight classifier heads on intermediate stages
+
+    The backbone and final classifier are shared with the wrapped model, not copied.
+    At inference, rows whose exit-head confidence reaches the threshold stop there and
+    only the remaining rows continue through the deeper (more expensive) stages.
+    """
+    def __init__(self, model: nn.Module, num_classes: int, exit_stages=DEFAULT_EXIT_STAGES):
+        super(EarlyExitEfficientNet, self).__init__()
+        self.model = model
+        self.num_classes = num_classes
+        self.exit_stages = tuple(exit_stages)
+        features = model.base_model.features
+        self.exit_heads = nn.ModuleDict({
+            str(stage): nn.Sequential(
+                nn.AdaptiveAvgPool2d(1),
+                nn.Flatten(),
+                nn.Linear(_stage_channels(features[stage]), num_classes)
+            )
+            for stage in self.exit_stages
+        })
+
+    def forward(self, x: torch.Tensor, threshold: float = 0.9) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Return probabilities and, per row, the feature stage it exited at (-1 = final head)"""
+        base = self.model.base_model
+        probabilities = x.new_zeros(len(x), self.num_classes)
+        exited_at = torch.full((len(x),), -1, dtype=torch.long, device=x.device)
+        active = torch.arange(len(x), device=x.device)
+
+        for index, stage in enumerate(base.features):
+            x = stage(x)
+            if index not in self.exit_stages:
+                continue
+            exit_probs = torch.softmax(self.exit_heads[str(index)](x), dim=1)
+            done = exit_probs.max(dim=1).values >= threshold
+            if done.any():
+                probabilities[active[done]] = exit_probs[done]
+                exited_at[active[done]] = index
+                active, x = active[~done], x[~done]
+            if len(active) == 0:
+                return probabilities, exited_at
+
+        probabilities[active] = torch.softmax(base.classifier(torch.flatten(base.avgpool(x), 1)), dim=1)
+        return probabilities, exited_at
+
+def _stage_channels(stage: nn.Module) -> int:
+    return [m for m in stage.modules() if isinstance(m, nn.Conv2d)][-1].out_channels
+
+def load_exit_heads(early_exit: EarlyExitEfficientNet, heads_path: str, device: torch.device):
+    early_exit.exit_heads.load_state_dict(torch.load(heads_path, map_location=device))
+    return early_exit.to(device).eval()
+
+def train_exit_heads(
+    early_exit: EarlyExitEfficientNet,
+    images: List[np.ndarray],
+    labels: np.ndarray,
+    device: torch.device,
+    num_epochs: int = 5,
+    batch_size: int = 32,
+    lr: float = 1e-3
+):
+    """Train only the exit heads on a frozen backbone with cross-entropy on the labels"""
+    early_exit.eval()  # keeps backbone BatchNorm statistics fixed
+    optimizer = torch.optim.AdamW(early_exit.exit_heads.parameters(), lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    for epoch in range(num_epochs):
+        order = np.random.permutation(len(images))
+        running_loss = 0.0
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            inputs = to_input_batch([images[i] for i in indices], device)
+            targets = torch.from_numpy(labels[indices]).to(device)
+            with torch.no_grad():
+                # Run the backbone once without gradients and keep the exit-stage features
+                features, x = {}, inputs
+                for index, stage in enumerate(early_exit.model.base_model.features):
+                    x = stage(x)
+                    if index in early_exit.exit_stages:
+                        features[index] = x
+            optimizer.zero_grad()
+            loss = sum(criterion(early_exit.exit_heads[str(i)](f), targets) for i, f in features.items())
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+        print(f'Epoch {epoch+1}/{num_epochs}, Exit head loss: {running_loss / max(1, len(order) // batch_size):.4f}')
+
+def benchmark(
+    model: nn.Module,
+    early_exit: EarlyExitEfficientNet,
+    images: List[np.ndarray],
+    labels: np.ndarray,
+    device: torch.device,
+    low_resolution: int,
+    thresholds: List[float]
+) -> List[Dict]:
+    """Measure per-image latency and accuracy of full, adaptive-resolution and early-exit inference"""
+    def run(name, predict):
+        correct, escalated, latencies = 0, 0, []
+        with torch.no_grad():
+            for image, label in zip(images, labels):
+                batch = to_input_batch([image], device)
+                start = time.perf_counter()
+                probabilities, went_deep = predict(batch)
+                latencies.append((time.perf_counter() - start) * 1000)
+                correct += int(probabilities.argmax(dim=1).item() == label)
+                escalated += int(went_deep)
+        return {
+            "mode": name,
+            "accuracy": correct / len(labels),
+            "mean_latency_ms": float(np.mean(latencies)),
+            "p95_latency_ms": float(np.percentile(latencies, 95)),
+            "full_compute_fraction": escalated / len(labels)
+        }
+
+    def full(batch):
+        return torch.softmax(model(batch), dim=1), True
+
+    def resolution(threshold):
+        def predict(batch):
+            probabilities, rerun = adaptive_resolution_predict(model, batch, low_resolution, threshold)
+            return probabilities, bool(rerun.any())
+        return predict
+
+    def exits(threshold):
+        def predict(batch):
+            probabilities, exited_at = early_exit(batch, threshold)
+            return probabilities, bool((exited_at == -1).any())
+        return predict
+
+    results = [run("full", full)]
+    for threshold in thresholds:
+        results.append(run(f"resolution_{low_resolution}@{threshold}", resolution(threshold)))
+        if early_exit is not None:
+            results.append(run(f"early_exit@{threshold}", exits(threshold)))
+    return results
+
+if __name__ == "__main__":
+    from model import CATEGORIES, EfficientNetB4Custom, load_model
+    from evaluation import load_labeled_images
+
+    parser = argparse.ArgumentParser(description="Train exit heads and benchmark adaptive inference on TrashNet")
+    parser.add_argument("command", choices=["train-exits", "benchmark"])
+    parser.add_argument("dataset_path", help="Dataset with one folder per category")
+    parser.add_argument("--model", default="TrashNet_Model.pth")
+    parser.add_argument("--exit-heads", default="TrashNet_ExitHeads.pth")
+    parser.add_argument("--low-resolution", type=int, default=160)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.8, 0.9, 0.95])
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--limit-per-class", type=int, default=None)
+    parser.add_argument("--output", default="adaptive_benchmark.json")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_model(EfficientNetB4Custom, args.model, device)
+    early_exit = EarlyExitEfficientNet(model, len(CATEGORIES)).to(device)
+    images, labels = load_labeled_images(args.dataset_path, CATEGORIES, args.limit_per_class)
+
+    if args.command == "train-exits":
+        train_exit_heads(early_exit, images, labels, device, num_epochs=args.epochs)
+        torch.save(early_exit.exit_heads.state_dict(), args.exit_heads)
+        print(f"Exit heads saved at {args.exit_heads}")
+    else:
+        if os.path.exists(args.exit_heads):
+            load_exit_heads(early_exit, args.exit_heads, device)
+        else:
+            logger.warning("No trained exit heads found; benchmarking adaptive resolution only")
+            early_exit = None
+        results = benchmark(model, early_exit, images, labels, device, args.low_resolution, args.thresholds)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        for row in results:
+            print(f"{row['mode']:>24}  acc {row['accuracy']:.2%}  mean {row['mean_latency_ms']:.1f}ms  "
+                  f"p95 {row['p95_latency_ms']:.1f}ms  full compute {row['full_compute_fraction']:.0%}")
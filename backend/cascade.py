@@ -0,0 +1,179 @@
+import os
+import json
+import argparse
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torchvision.models as models
+from typing import Dict, List, Tuple
+from preprocessing import to_input_batch
+
+logger = logging.getLogger(__name__)
+
+class FastClassifier(nn.Module):
+    """MobileNetV3-Small classifier used as the cheap first stage of the cascade"""
+    def __init__(self, num_classes, pretrained=True):
+        super(FastClassifier, self).__init__()
+        self.base_model = models.mobilenet_v3_small(pretrained=pretrained)
+        in_features = self.base_model.classifier[-1].in_features
+        self.base_model.classifier[-1] = nn.Linear(in_features, num_classes)
+
+    def forward(self, x):
+        return self.base_model(x)
+
+def cascade_predict(
+    batch: torch.Tensor,
+    fast_model: nn.Module,
+    full_model: nn.Module,
+    threshold: float
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Classify a batch with the fast model and re-run only its unsure rows through the full model
+
+    Returns softmax probabilities for every row and a boolean mask of the escalated rows.
+    """
+    probabilities = torch.softmax(fast_model(batch), dim=1)
+    escalate = probabilities.max(dim=1).values < threshold
+    if escalate.any():
+        probabilities[escalate] = torch.softmax(full_model(batch[escalate]), dim=1)
+    return probabilities, escalate
+
+def distill_fast_model(
+    student: nn.Module,
+    teacher: nn.Module,
+    images: List[np.ndarray],
+    labels: np.ndarray,
+    device: torch.device,
+    num_epochs: int = 10,
+    batch_size: int = 32,
+    lr: float = 1e-3,
+    temperature: float = 4.0,
+    alpha: float = 0.7
+):
+    """Train the fast model on the full model's softened outputs plus the labels
+
+    The loss is ``alpha`` times the temperature-scaled KL divergence to the teacher and
+    ``1 - alpha`` times cross-entropy; batches are randomly flipped horizontally.
+    """
+    teacher.eval()
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+    for epoch in range(num_epochs):
+        student.train()
+        order = np.random.permutation(len(images))
+        running_loss = 0.0
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            inputs = to_input_batch([images[i] for i in indices], device)
+            inputs = torch.where(
+                torch.rand(len(indices), 1, 1, 1, device=device) < 0.5, inputs.flip(3), inputs
+            )
+            targets = torch.from_numpy(labels[indices]).to(device)
+            with torch.no_grad():
+                soft_targets = F.softmax(teacher(inputs) / temperature, dim=1)
+
+            optimizer.zero_grad()
+            logits = student(inputs)
+            distillation = F.kl_div(
+                F.log_softmax(logits / temperature, dim=1), soft_targets, reduction="batchmean"
+            ) * temperature ** 2
+            loss = alpha * distillation + (1 - alpha) * F.cross_entropy(logits, targets)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+        print(f'Epoch {epoch+1}/{num_epochs}, Distillation loss: {running_loss / max(1, len(order) // batch_size):.4f}')
+    student.eval()
+    return student
+
+def calibrate_threshold(
+    fast_probs: np.ndarray,
+    full_probs: np.ndarray,
+    labels: np.ndarray,
+    target_accuracy: float
+) -> Dict:
+    """Pick the lowest fast-model confidence threshold whose cascade accuracy meets the target
+
+    Escalating the k least confident inputs is evaluated for every k at once: inputs are
+    sorted by fast-model confidence and the accuracy of each cut is read off cumulative sums.
+    """
+    confidence = fast_probs.max(axis=1).astype(np.float32)
+    order = np.argsort(confidence, kind="stable")
+    sorted_confidence = confidence[order]
+    fast_correct = (fast_probs.argmax(axis=1) == labels)[order]
+    full_correct = (full_probs.argmax(axis=1) == labels)[order]
+
+    # accuracy[k] is the cascade accuracy when the k least confident inputs are escalated
+    n = len(labels)
+    escalated_correct = np.concatenate([[0], np.cumsum(full_correct)])
+    kept_correct = fast_correct.sum() - np.concatenate([[0], np.cumsum(fast_correct)])
+    accuracy = (escalated_correct + kept_correct) / n
+
+    meets_target = np.nonzero(accuracy >= target_accuracy)[0]
+    if len(meets_target) == 0:
+        logger.warning(
+            f"Target accuracy {target_accuracy:.2%} is above the full model accuracy; "
+            "escalating every input"
+        )
+        k = n
+    else:
+        k = int(meets_target[0])
+
+    # Inputs strictly below the threshold are escalated; nudging just past the k-th lowest
+    # confidence also escalates any ties with it, so re-read the accuracy at the real cut
+    threshold = float(np.nextafter(sorted_confidence[k - 1], np.float32(np.inf))) if k > 0 else 0.0
+    k = int(np.searchsorted(sorted_confidence, threshold, side="left"))
+    return {
+        "threshold": threshold,
+        "target_accuracy": target_accuracy,
+        "cascade_accuracy": float(accuracy[k]),
+        "fast_accuracy": float(fast_correct.mean()),
+        "full_accuracy": float(full_correct.mean()),
+        "escalation_rate": k / n,
+        "num_samples": n
+    }
+
+def load_threshold(calibration_path: str, default: float) -> float:
+    """Read the calibrated threshold written by the calibration tool, if any"""
+    if not os.path.exists(calibration_path):
+        return default
+    with open(calibration_path) as f:
+        return float(json.load(f)["threshold"])
+
+if __name__ == "__main__":
+    from model import CATEGORIES, EfficientNetB4Custom, load_model
+    from evaluation import load_labeled_images, collect_probabilities
+
+    parser = argparse.ArgumentParser(description="Distill the cascade's fast model and calibrate its threshold")
+    parser.add_argument("command", choices=["distill", "calibrate"])
+    parser.add_argument("dataset_path", help="Training (distill) or validation (calibrate) set with one folder per category")
+    parser.add_argument("--target-accuracy", type=float, help="Required for calibrate")
+    parser.add_argument("--full-model", default="TrashNet_Model.pth")
+    parser.add_argument("--fast-model", default="TrashNet_Fast.pth")
+    parser.add_argument("--output", default="cascade_calibration.json")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--limit-per-class", type=int, default=None)
+    args = parser.parse_args()
+    if args.command == "calibrate" and args.target_accuracy is None:
+        parser.error("calibrate needs --target-accuracy")
+
+    logging.basicConfig(level=logging.INFO)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    full_model = load_model(EfficientNetB4Custom, args.full_model, device)
+    images, labels = load_labeled_images(args.dataset_path, CATEGORIES, args.limit_per_class)
+
+    if args.command == "distill":
+        # Starts from ImageNet weights; the server loads the result with load_model
+        student = FastClassifier(len(CATEGORIES), pretrained=True).to(device)
+        distill_fast_model(student, full_model, images, labels, device, args.epochs, temperature=args.temperature)
+        torch.save(student.state_dict(), args.fast_model)
+        print(f"Fast model saved at {args.fast_model}")
+    else:
+        fast_model = load_model(FastClassifier, args.fast_model, device)
+        fast_probs = collect_probabilities(lambda x: torch.softmax(fast_model(x), dim=1), images, device)
+        full_probs = collect_probabilities(lambda x: torch.softmax(full_model(x), dim=1), images, device)
+
+        result = calibrate_threshold(fast_probs, full_probs, labels, args.target_accuracy)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,244 @@
+import os
+import copy
+import json
+import time
+import argparse
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+from typing import Dict, List, Optional, Tuple
+from preprocessing import INPUT_SIZE, to_input_batch
+
+logger = logging.getLogger(__name__)
+
+PRUNED_SUFFIX = ".pruned.pth"  # checkpoints holding {"widths", "state_dict"}
+CHANNEL_MULTIPLE = 8  # kept widths are rounded to SIMD-friendly multiples
+HEAD_LINEARS = (0, 4, 8)  # classifier Linear layers whose hidden units can be pruned
+
+def _slice_parameter(module: nn.Module, name: str, index: torch.Tensor, dim: int):
+    tensor = getattr(module, name)
+    if tensor is None:
+        return
+    sliced = tensor.data.index_select(dim, index).clone()
+    if isinstance(tensor, nn.Parameter):
+        setattr(module, name, nn.Parameter(sliced, requires_grad=tensor.requires_grad))
+    else:
+        setattr(module, name, sliced)
+
+def _keep_conv_out(conv: nn.Conv2d, index: torch.Tensor):
+    _slice_parameter(conv, "weight", index, 0)
+    _slice_parameter(conv, "bias", index, 0)
+    conv.out_channels = len(index)
+
+def _keep_conv_in(conv: nn.Conv2d, index: torch.Tensor):
+    _slice_parameter(conv, "weight", index, 1)
+    conv.in_channels = len(index)
+
+def _keep_depthwise(conv: nn.Conv2d, index: torch.Tensor):
+    _keep_conv_out(conv, index)
+    conv.in_channels = conv.groups = len(index)
+
+def _keep_norm(bn: nn.modules.batchnorm._BatchNorm, index: torch.Tensor):
+    for name in ("weight", "bias", "running_mean", "running_var"):
+        _slice_parameter(bn, name, index, 0)
+    bn.num_features = len(index)
+
+def _keep_linear(linear: nn.Linear, out_index: Optional[torch.Tensor] = None, in_index: Optional[torch.Tensor] = None):
+    if out_index is not None:
+        _slice_parameter(linear, "weight", out_index, 0)
+        _slice_parameter(linear, "bias", out_index, 0)
+        linear.out_features = len(out_index)
+    if in_index is not None:
+        _slice_parameter(linear, "weight", in_index, 1)
+        linear.in_features = len(in_index)
+
+def _expanded_blocks(model: nn.Module) -> Dict[str, nn.Sequential]:
+    """MBConv blocks with an expansion conv, keyed by name
+
+    Their expanded (hidden) channels are internal to the block, so pruning them leaves
+    the block's input/output widths and residual connections untouched.
+    """
+    blocks = {}
+    for stage_index, stage in enumerate(model.base_model.features[1:8], start=1):
+        for block_index, block in enumerate(stage):
+            if len(block.block) == 4:  # expand, depthwise, squeeze-excitation, project
+                blocks[f"features.{stage_index}.{block_index}"] = block.block
+    return blocks
+
+def channel_importance(model: nn.Module) -> Dict[str, torch.Tensor]:
+    """Network-slimming importance: |gamma| of the BatchNorm that scales each prunable channel"""
+    importance = {name: block[1][1].weight.detach().abs() for name, block in _expanded_blocks(model).items()}
+    importance["features.8"] = model.base_model.features[8][1].weight.detach().abs()
+    classifier = model.base_model.classifier
+    for index in HEAD_LINEARS:
+        importance[f"classifier.{index}"] = classifier[index + 2].weight.detach().abs()
+    return importance
+
+def _apply_keep(model: nn.Module, keep: Dict[str, torch.Tensor]) -> nn.Module:
+    for name, block in _expanded_blocks(model).items():
+        index = keep[name]
+        expand, depthwise, squeeze, project = block
+        _keep_conv_out(expand[0], index)
+        _keep_norm(expand[1], index)
+        _keep_depthwise(depthwise[0], index)
+        _keep_norm(depthwise[1], index)
+        _keep_conv_in(squeeze.fc1, index)
+        _keep_conv_out(squeeze.fc2, index)
+        _keep_conv_in(project[0], index)
+
+    final, classifier = model.base_model.features[8], model.base_model.classifier
+    _keep_conv_out(final[0], keep["features.8"])
+    _keep_norm(final[1], keep["features.8"])
+    in_index = keep["features.8"]
+    for index in HEAD_LINEARS:
+        out_index = keep[f"classifier.{index}"]
+        _keep_linear(classifier[index], out_index, in_index)
+        _keep_norm(classifier[index + 2], out_index)
+        in_index = out_index
+    _keep_linear(classifier[12], in_index=in_index)
+    return model
+
+def prune(model: nn.Module, ratio: float) -> Tuple[nn.Module, Dict[str, int]]:
+    """Remove the ``ratio`` least important channels of every prunable layer; returns a copy"""
+    model = copy.deepcopy(model)
+    keep, widths = {}, {}
+    for name, scores in channel_importance(model).items():
+        count = int(round(len(scores) * (1 - ratio) / CHANNEL_MULTIPLE)) * CHANNEL_MULTIPLE
+        count = min(len(scores), max(CHANNEL_MULTIPLE, count))
+        # Keep the original channel order so the tensors stay contiguous slices where possible
+        keep[name] = torch.sort(torch.topk(scores, count).indices).values
+        widths[name] = count
+    return _apply_keep(model, keep), widths
+
+def build_pruned_model(widths: Dict[str, int], num_classes: int) -> nn.Module:
+    """An untrained EfficientNetB4Custom with the given layer widths, ready for a state dict"""
+    from model import EfficientNetB4Custom
+    model = EfficientNetB4Custom(num_classes=num_classes, pretrained=False)
+    return _apply_keep(model, {name: torch.arange(width) for name, width in widths.items()})
+
+def save_pruned_model(model: nn.Module, widths: Dict[str, int], path: str):
+    torch.save({"widths": widths, "state_dict": model.state_dict()}, path)
+
+def load_pruned_model(path: str, num_classes: int, device: torch.device) -> nn.Module:
+    checkpoint = torch.load(path, map_location=device)
+    model = build_pruned_model(checkpoint["widths"], num_classes)
+    model.load_state_dict(checkpoint["state_dict"])
+    return model.to(device).eval()
+
+def fine_tune(
+    model: nn.Module,
+    images: List[np.ndarray],
+    labels: np.ndarray,
+    device: torch.device,
+    num_epochs: int = 3,
+    batch_size: int = 16,
+    lr: float = 1e-4
+):
+    """Short recovery training, the same loop and optimizer as train_model in pytorch.py
+
+    pytorch.py is a notebook export that trains on import, so its loop is mirrored here
+    rather than imported; random flips stand in for its augmentation pipeline.
+    """
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    for epoch in range(num_epochs):
+        model.train()
+        running_loss, correct = 0.0, 0
+        order = np.random.permutation(len(images))
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            if len(indices) < 2:
+                continue  # BatchNorm1d in the head needs more than one row in train mode
+            inputs = to_input_batch([images[i] for i in indices], device)
+            if np.random.rand() < 0.5:
+                inputs = torch.flip(inputs, dims=[3])
+            targets = torch.from_numpy(labels[indices]).to(device)
+            optimizer.zero_grad()
+            outputs = model(inputs)
+            loss = criterion(outputs, targets)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+            correct += outputs.argmax(dim=1).eq(targets).sum().item()
+        print(f'Epoch {epoch+1}/{num_epochs}, Train Loss: {running_loss / max(1, len(order) // batch_size):.4f}, '
+              f'Train Acc: {100. * correct / len(order):.2f}%')
+    model.eval()
+
+def measure(model: nn.Module, images: List[np.ndarray], labels: np.ndarray, device: torch.device,
+            batch_sizes=(1, 8), iterations: int = 20) -> Dict:
+    """Accuracy, weight memory and median CPU latency of an eval-mode model"""
+    from evaluation import collect_probabilities
+
+    model.eval()
+    probabilities = collect_probabilities(lambda x: model(x), images, device)
+    weight_bytes = sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+    row = {
+        "accuracy": float(np.mean(probabilities.argmax(axis=1) == labels)),
+        "parameters": sum(p.numel() for p in model.parameters()),
+        "weights_mb": round(weight_bytes / 2 ** 20, 1)
+    }
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            batch = torch.randn(batch_size, 3, INPUT_SIZE, INPUT_SIZE, device=device)
+            model(batch)  # warm-up
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                model(batch)
+                latencies.append((time.perf_counter() - start) * 1000)
+            row[f"latency_ms_batch{batch_size}"] = round(float(np.median(latencies)), 2)
+    return row
+
+if __name__ == "__main__":
+    from model import CATEGORIES, EfficientNetB4Custom, load_model
+    from evaluation import load_labeled_images
+
+    parser = argparse.ArgumentParser(description="Prune TrashNet_Model.pth at several levels and report the trade-offs")
+    parser.add_argument("dataset_path", help="Dataset with one folder per category")
+    parser.add_argument("--model", default="TrashNet_Model.pth")
+    parser.add_argument("--ratios", type=float, nargs="+", default=[0.25, 0.5, 0.75])
+    parser.add_argument("--epochs", type=int, default=3, help="Fine-tuning epochs per pruning level")
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Accuracy SLA on the validation split")
+    parser.add_argument("--limit-per-class", type=int, default=None)
+    parser.add_argument("--output-dir", default=".")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Latency is reported for CPU serving, so everything runs on the CPU
+    device = torch.device("cpu")
+    model = load_model(EfficientNetB4Custom, args.model, device)
+    images, labels = load_labeled_images(args.dataset_path, CATEGORIES, args.limit_per_class)
+    order = np.random.default_rng(0).permutation(len(images))
+    val_count = int(len(order) * args.val_fraction)
+    val_images, val_labels = [images[i] for i in order[:val_count]], labels[order[:val_count]]
+    train_images, train_labels = [images[i] for i in order[val_count:]], labels[order[val_count:]]
+
+    name = os.path.splitext(os.path.basename(args.model))[0]
+    report = [{"ratio": 0.0, "path": args.model, **measure(model, val_images, val_labels, device)}]
+    for ratio in args.ratios:
+        pruned, widths = prune(model, ratio)
+        before = measure(pruned, val_images, val_labels, device, batch_sizes=())["accuracy"]
+        fine_tune(pruned, train_images, train_labels, device, args.epochs)
+        path = os.path.join(args.output_dir, f"{name}_{int(ratio * 100)}{PRUNED_SUFFIX}")
+        save_pruned_model(pruned, widths, path)
+        row = {"ratio": ratio, "path": path, "accuracy_before_fine_tune": before,
+               **measure(pruned, val_images, val_labels, device)}
+        row["file_mb"] = round(os.path.getsize(path) / 2 ** 20, 1)
+        report.append(row)
+        print(json.dumps(row))
+
+    eligible = [r for r in report if args.min_accuracy is None or r["accuracy"] >= args.min_accuracy]
+    chosen = min(eligible, key=lambda r: r["weights_mb"]) if eligible else None
+    with open(os.path.join(args.output_dir, "compression_report.json"), "w") as f:
+        json.dump({"levels": report, "min_accuracy": args.min_accuracy, "chosen": chosen}, f, indent=2)
+
+    print(f"\n{'ratio':>6}{'accuracy':>10}{'weights MB':>12}{'b1 ms':>9}{'b8 ms':>9}")
+    for row in report:
+        print(f"{row['ratio']:>6.2f}{row['accuracy']:>10.2%}{row['weights_mb']:>12}"
+              f"{row['latency_ms_batch1']:>9}{row['latency_ms_batch8']:>9}")
+    if chosen:
+        print(f"Smallest model meeting the SLA: {chosen['path']}")
+    else:
+        print("No pruning level meets the accuracy SLA")
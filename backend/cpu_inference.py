@@ -0,0 +1,140 @@
+import copy
+import json
+import time
+import argparse
+import logging
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from typing import Dict, List
+from evaluation import collect_probabilities
+
+logger = logging.getLogger(__name__)
+
+# A report only approves the mode when it stays this close to float32
+MAX_ACCURACY_DROP = 0.005
+MIN_AGREEMENT = 0.99
+
+def bf16_supported() -> bool:
+    """True when oneDNN has native bfloat16 kernels on this CPU (AVX512-BF16 or AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def fuse_conv_bn(model: nn.Module) -> nn.Module:
+    """Fold every BatchNorm2d that directly follows a Conv2d into the convolution's weights"""
+    for module in list(model.modules()):
+        if not isinstance(module, nn.Sequential):
+            continue
+        children = list(module._modules.items())
+        for (conv_name, conv), (bn_name, bn) in zip(children, children[1:]):
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                module._modules[conv_name] = fuse_conv_bn_eval(conv, bn)
+                module._modules[bn_name] = nn.Identity()
+    return model
+
+class CPUOptimizedModel(nn.Module):
+    """Eval-only wrapper that runs a model channels-last, optionally under bfloat16 autocast
+
+    Inputs are converted to channels-last on the way in and outputs are returned as
+    float32, so callers are unaffected. ``base_model`` is exposed for code that walks the
+    backbone (early exit, Grad-CAM).
+    """
+    def __init__(self, model: nn.Module, channels_last: bool = True, bf16: bool = False, fuse: bool = True):
+        super(CPUOptimizedModel, self).__init__()
+        model = copy.deepcopy(model).eval()
+        if fuse:
+            model = fuse_conv_bn(model)
+        if channels_last:
+            model = model.to(memory_format=torch.channels_last)
+        self.model = model
+        self.channels_last = channels_last
+        self.bf16 = bf16
+
+    @property
+    def base_model(self) -> nn.Module:
+        return self.model.base_model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        with torch.autocast("cpu", dtype=torch.bfloat16, enabled=self.bf16):
+            return self.model(x).float()
+
+def parity_report(
+    reference: nn.Module,
+    candidate: nn.Module,
+    images: List[np.ndarray],
+    labels: np.ndarray,
+    device: torch.device,
+    batch_size: int = 32
+) -> Dict:
+    """Compare a candidate against the float32 reference on a labeled validation set"""
+    def timed(model):
+        start = time.perf_counter()
+        probabilities = collect_probabilities(lambda x: torch.softmax(model(x), dim=1), images, device, batch_size)
+        return probabilities, (time.perf_counter() - start) * 1000 / len(images)
+
+    collect_probabilities(candidate, images[:batch_size], device, batch_size)  # warm-up
+    reference_probs, reference_ms = timed(reference)
+    candidate_probs, candidate_ms = timed(candidate)
+
+    reference_accuracy = float(np.mean(reference_probs.argmax(axis=1) == labels))
+    candidate_accuracy = float(np.mean(candidate_probs.argmax(axis=1) == labels))
+    agreement = float(np.mean(reference_probs.argmax(axis=1) == candidate_probs.argmax(axis=1)))
+    difference = np.abs(reference_probs - candidate_probs)
+    return {
+        "images": len(images),
+        "reference_accuracy": reference_accuracy,
+        "candidate_accuracy": candidate_accuracy,
+        "top1_agreement": agreement,
+        "max_probability_diff": float(difference.max()),
+        "mean_probability_diff": float(difference.mean()),
+        "reference_ms_per_image": reference_ms,
+        "candidate_ms_per_image": candidate_ms,
+        "approved": reference_accuracy - candidate_accuracy <= MAX_ACCURACY_DROP and agreement >= MIN_AGREEMENT
+    }
+
+def load_approved_settings(report_path: str, model_digest: str) -> Dict:
+    """Settings of an approved parity report for this exact weights file, else raise ValueError"""
+    with open(report_path) as f:
+        report = json.load(f)
+    if report["model_digest"] != model_digest:
+        raise ValueError("Parity report was measured on different model weights")
+    if not report["approved"]:
+        raise ValueError("Parity report did not approve the optimized mode")
+    if report["settings"]["bf16"] and not bf16_supported():
+        raise ValueError("Parity report approved bfloat16 but this CPU has no native bfloat16 support")
+    return report["settings"]
+
+if __name__ == "__main__":
+    from model import CATEGORIES, EfficientNetB4Custom, load_model
+    from model_manager import file_digest
+    from evaluation import load_labeled_images
+
+    parser = argparse.ArgumentParser(description="Measure channels-last/bfloat16/fused inference against float32")
+    parser.add_argument("dataset_path", help="Validation set with one folder per category")
+    parser.add_argument("--model", default="TrashNet_Model.pth")
+    parser.add_argument("--bf16", action="store_true", help="Also run under bfloat16 autocast")
+    parser.add_argument("--no-channels-last", action="store_true")
+    parser.add_argument("--no-fuse", action="store_true")
+    parser.add_argument("--limit-per-class", type=int, default=None)
+    parser.add_argument("--output", default="cpu_inference_report.json")
+    args = parser.parse_args()
+
+    if args.bf16 and not bf16_supported():
+        logger.warning("No native bfloat16 kernels on this CPU; bfloat16 will be emulated and slow")
+
+    device = torch.device("cpu")
+    model = load_model(EfficientNetB4Custom, args.model, device)
+    settings = {"channels_last": not args.no_channels_last, "bf16": args.bf16, "fuse": not args.no_fuse}
+    candidate = CPUOptimizedModel(model, **settings)
+    images, labels = load_labeled_images(args.dataset_path, CATEGORIES, args.limit_per_class)
+
+    report = parity_report(model, candidate, images, labels, device)
+    report.update({"settings": settings, "model_digest": file_digest(args.model)})
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,67 @@
+import cv2
+import numpy as np
+from io import BytesIO
+from PIL import Image, UnidentifiedImageError
+from typing import Tuple
+from preprocessing import INPUT_SIZE, prepare_image
+
+MAX_PIXELS = 50_000_000  # larger uploads are rejected before any pixel buffer is allocated
+DISPLAY_MAX_SIDE = 1280  # longest side of the annotated image sent back to clients
+
+# Decode scale -> flag; JPEG applies the scale inside the IDCT, so the full-size
+# bitmap is never materialized
+REDUCED_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    1: cv2.IMREAD_COLOR
+}
+
+class ImageDecodeError(ValueError):
+    pass
+
+class ImageTooLargeError(ImageDecodeError):
+    pass
+
+def read_dimensions(data: bytes) -> Tuple[int, int]:
+    """Width and height from the image header, without decoding any pixels"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            return image.size
+    except Image.DecompressionBombError as e:
+        # PIL refuses to even open headers past twice its own limit; same outcome as ours
+        raise ImageTooLargeError(str(e))
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImageDecodeError(f"Could not read image: {e}")
+
+def decode_scale(width: int, height: int, min_side: int = INPUT_SIZE, display_max_side: int = DISPLAY_MAX_SIDE) -> int:
+    """Largest reduction that still covers the model input and the capped display size"""
+    for scale in (8, 4, 2):
+        if (min(width, height) // scale >= min_side
+                and max(width, height) // scale >= min(max(width, height), display_max_side)):
+            return scale
+    return 1
+
+def decode_image(data: bytes, display_max_side: int = DISPLAY_MAX_SIDE, max_pixels: int = MAX_PIXELS) -> np.ndarray:
+    """Decode an upload once, at the smallest scale the display image needs, as BGR"""
+    width, height = read_dimensions(data)
+    if width * height > max_pixels:
+        raise ImageTooLargeError(f"Image of {width}x{height} exceeds the {max_pixels} pixel limit")
+
+    flags = REDUCED_FLAGS[decode_scale(width, height, display_max_side=display_max_side)]
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if image is None:
+        raise ImageDecodeError("Could not read image")
+
+    # Reduced decoding only works in powers of two; finish the cap with an area resize
+    longest = max(image.shape[:2])
+    if longest > display_max_side:
+        factor = display_max_side / longest
+        image = cv2.resize(image, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    return image
+
+def decode_upload(data: bytes, display_max_side: int = DISPLAY_MAX_SIDE,
+                  max_pixels: int = MAX_PIXELS) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (model input, display image) for an uploaded image, decoding it once"""
+    display = decode_image(data, display_max_side, max_pixels)
+    return prepare_image(display), display
@@ -0,0 +1,94 @@
+import time
+import logging
+import threading
+import numpy as np
+import torch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class EnsembleMember:
+    """One model of the ensemble: a function from prepared RGB inputs to probabilities"""
+    def __init__(self, name: str, predict_func: Callable[[List[np.ndarray]], torch.Tensor], weight: float = 1.0):
+        self.name = name
+        self.predict_func = predict_func
+        self.weight = weight
+        # One worker per member: members run concurrently, each member's calls in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ensemble-{name}")
+        self.latencies_ms = deque(maxlen=1000)
+
+    def predict(self, images: List[np.ndarray]) -> Tuple[np.ndarray, float]:
+        """Probabilities and latency in ms; the caller records the latency"""
+        start = time.monotonic()
+        probabilities = self.predict_func(images)
+        if isinstance(probabilities, torch.Tensor):
+            probabilities = probabilities.float().cpu().numpy()
+        return probabilities, (time.monotonic() - start) * 1000
+
+class Ensemble:
+    """Weighted average of several models' probabilities, with the members run in parallel
+
+    Every member gets the same prepared batch on its own executor thread; PyTorch and
+    TFLite both release the GIL while computing, so a batch takes about as long as the
+    slowest member rather than the sum.
+    """
+    def __init__(self, members: List[EnsembleMember]):
+        if not members:
+            raise ValueError("An ensemble needs at least one member")
+        self.members = members
+        total = sum(member.weight for member in members)
+        self.weights = [member.weight / total for member in members]
+        self.latencies_ms = deque(maxlen=1000)
+        self.images = 0
+        self.disagreements = 0  # images on which the members' top classes differ
+        self._stats_lock = threading.Lock()  # predict may be called from several threads
+
+    def predict(self, images: List[np.ndarray]) -> torch.Tensor:
+        start = time.monotonic()
+        futures = [member.executor.submit(member.predict, images) for member in self.members]
+        outputs, member_latencies = zip(*[future.result() for future in futures])
+        latency_ms = (time.monotonic() - start) * 1000
+
+        top_classes = np.stack([output.argmax(axis=1) for output in outputs])
+        disagreements = int(np.sum(np.any(top_classes != top_classes[0], axis=0)))
+        with self._stats_lock:
+            for member, member_latency in zip(self.members, member_latencies):
+                member.latencies_ms.append(member_latency)
+            self.latencies_ms.append(latency_ms)
+            self.images += len(images)
+            self.disagreements += disagreements
+        combined = sum(weight * output for weight, output in zip(self.weights, outputs))
+        return torch.from_numpy(combined.astype(np.float32))
+
+    def close(self):
+        for member in self.members:
+            member.executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        def median(values):
+            return round(float(np.median(values)), 1) if values else None
+
+        with self._stats_lock:
+            member_latencies = [list(member.latencies_ms) for member in self.members]
+            latencies = list(self.latencies_ms)
+            images, disagreements = self.images, self.disagreements
+        return {
+            "members": [{
+                "name": member.name,
+                "weight": round(weight, 3),
+                "median_latency_ms": median(values)
+            } for member, weight, values in zip(self.members, self.weights, member_latencies)],
+            "median_latency_ms": median(latencies),
+            "images": images,
+            "disagreement_rate": round(disagreements / images, 4) if images else None
+        }
+
+def torchscript_predictor(module: torch.jit.ScriptModule, device: torch.device) -> Callable:
+    """Predictor for the Keras model converted by h5topytorch.py (RGB 0-255 NCHW in, logits out)"""
+    def predict(images: List[np.ndarray]) -> torch.Tensor:
+        batch = torch.from_numpy(np.stack(images)).to(device).permute(0, 3, 1, 2).float()
+        with torch.no_grad():
+            return torch.softmax(module(batch), dim=1)
+    return predict
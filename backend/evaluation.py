@@ -0,0 +1,44 @@
+import os
+import cv2
+import numpy as np
+import torch
+from typing import Callable, List, Optional, Tuple
+from preprocessing import prepare_image, to_input_batch
+
+def load_labeled_images(
+    dataset_path: str,
+    categories: List[str],
+    limit_per_class: Optional[int] = None
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """Load a TrashNet-style dataset (one folder per category) as model-ready RGB images"""
+    images, labels = [], []
+    for label, category in enumerate(categories):
+        category_path = os.path.join(dataset_path, category)
+        if not os.path.isdir(category_path):
+            raise FileNotFoundError(f"Category folder not found: {category_path}")
+
+        names = sorted(os.listdir(category_path))
+        if limit_per_class is not None:
+            names = names[:limit_per_class]
+        for img_name in names:
+            img = cv2.imread(os.path.join(category_path, img_name))
+            if img is None:
+                continue
+            images.append(prepare_image(img))
+            labels.append(label)
+
+    return images, np.array(labels)
+
+def collect_probabilities(
+    predict_func: Callable[[torch.Tensor], torch.Tensor],
+    images: List[np.ndarray],
+    device: torch.device,
+    batch_size: int = 32
+) -> np.ndarray:
+    """Run a batch prediction function over a list of images and return stacked probabilities"""
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(images), batch_size):
+            batch = to_input_batch(images[start:start + batch_size], device)
+            outputs.append(predict_func(batch).float().cpu().numpy())
+    return np.concatenate(outputs)
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+import cv2
+import numpy as np
+import torch
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+HEATMAP_SIZE = 64  # heatmaps are coarse (7x7 features at 224px), so a small render is enough
+
+def grad_cam(model: torch.nn.Module, batch: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Predict a batch and return (probabilities, Grad-CAM maps) from the same forward pass
+
+    The backbone runs once without gradients; only the pooled features are tracked, so
+    the backward pass covers just the classifier head. Average pooling spreads the
+    gradient evenly over the feature map, so the gradient w.r.t. the pooled vector is
+    exactly the Grad-CAM channel weighting (up to a constant factor).
+    """
+    base = model.base_model
+    with torch.no_grad():
+        features = base.features(batch)
+        pooled = torch.flatten(base.avgpool(features), 1)
+
+    pooled.requires_grad_(True)
+    with torch.enable_grad():
+        logits = base.classifier(pooled)
+        predicted = logits.argmax(dim=1)
+        # autograd.grad leaves the parameters' .grad untouched, unlike backward()
+        weights, = torch.autograd.grad(logits.gather(1, predicted[:, None]).sum(), pooled)
+
+    with torch.no_grad():
+        cams = torch.relu(torch.einsum("nc,nchw->nhw", weights, features))
+        peak = cams.flatten(1).max(dim=1).values.clamp_min(1e-8)
+        cams = cams / peak[:, None, None]
+        probabilities = torch.softmax(logits.detach(), dim=1)
+    return probabilities, cams
+
+def render_heatmap(cam: torch.Tensor, size: int = HEATMAP_SIZE) -> bytes:
+    """Colour a [0, 1] activation map and encode it as a small JPEG"""
+    cam = cv2.resize(cam.cpu().numpy(), (size, size), interpolation=cv2.INTER_LINEAR)
+    colored = cv2.applyColorMap((cam * 255).astype(np.uint8), cv2.COLORMAP_JET)
+    _, buffer = cv2.imencode(".jpg", colored)
+    return buffer.tobytes()
+
+class ExplanationCache:
+    """LRU of (probabilities, heatmap) per model version and model input
+
+    Keyed on the prepared 224px input, so re-uploads of the same photo (at any size that
+    prepares to the same pixels) skip both the prediction and the explanation.
+    """
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(version: str, model_input: np.ndarray) -> Tuple[str, bytes]:
+        return version, hashlib.blake2b(model_input.tobytes(), digest_size=16).digest()
+
+    def get(self, key) -> Optional[Tuple[np.ndarray, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry: Tuple[np.ndarray, bytes]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
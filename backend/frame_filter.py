@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+from typing import Dict, Optional
+
+ANALYSIS_WIDTH = 160  # all checks run on a small grayscale copy of the frame
+
+class FrameFilter:
+    """Cheap per-stream checks that keep useless frames away from the model
+
+    ``check`` returns why a frame should be skipped ("underexposed", "overexposed",
+    "blurry" or "empty") or None when it is worth classifying. Emptiness compares the
+    frame with a running-average background of the stream, so it only applies once
+    ``warmup_frames`` frames have been seen. A threshold of 0 disables that check.
+    """
+    def __init__(
+        self,
+        min_brightness: float = 25.0,
+        max_brightness: float = 230.0,
+        blur_threshold: float = 30.0,
+        min_occupancy: float = 0.02,
+        diff_threshold: int = 25,
+        background_rate: float = 0.05,
+        warmup_frames: int = 10
+    ):
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.blur_threshold = blur_threshold
+        self.min_occupancy = min_occupancy
+        self.diff_threshold = diff_threshold
+        self.background_rate = background_rate
+        self.warmup_frames = warmup_frames
+        self.background = None
+        self.frames_seen = 0
+        self.skipped = {"underexposed": 0, "overexposed": 0, "blurry": 0, "empty": 0}
+
+    def _analysis_image(self, image: np.ndarray) -> np.ndarray:
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        scale = ANALYSIS_WIDTH / image.shape[1]
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return image
+
+    def _occupancy(self, gray: np.ndarray) -> Optional[float]:
+        """Fraction of pixels differing from the background, or None while it warms up"""
+        current = gray.astype(np.float32)
+        if self.background is None or self.background.shape != current.shape:
+            self.background = current
+            self.frames_seen = 0
+        self.frames_seen += 1
+        occupancy = float(np.mean(np.abs(current - self.background) > self.diff_threshold))
+        cv2.accumulateWeighted(current, self.background, self.background_rate)
+        return occupancy if self.frames_seen > self.warmup_frames else None
+
+    def check(self, image: np.ndarray) -> Optional[str]:
+        gray = self._analysis_image(image)
+        reason = None
+        brightness = float(gray.mean())
+        if brightness < self.min_brightness:
+            reason = "underexposed"
+        elif brightness > self.max_brightness:
+            reason = "overexposed"
+        elif self.blur_threshold and cv2.Laplacian(gray, cv2.CV_32F).var() < self.blur_threshold:
+            reason = "blurry"
+
+        # The background keeps learning from every frame, including skipped ones
+        occupancy = self._occupancy(gray) if self.min_occupancy else None
+        if reason is None and occupancy is not None and occupancy < self.min_occupancy:
+            reason = "empty"
+
+        if reason is not None:
+            self.skipped[reason] += 1
+        return reason
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.skipped)
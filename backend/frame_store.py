@@ -0,0 +1,174 @@
+import os
+import re
+import hashlib
+import logging
+import threading
+import cv2
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from starlette.responses import Response
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIDE = 160
+CACHE_CONTROL = "public, max-age=31536000, immutable"  # keys are content hashes, so never stale
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def encode_thumbnail(image: np.ndarray, side: int = THUMBNAIL_SIDE) -> bytes:
+    scale = side / max(image.shape[:2])
+    if scale < 1:
+        image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    _, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return buffer.tobytes()
+
+class FrameStore:
+    """Content-addressed, size-bounded JPEG store on local disk with LRU eviction
+
+    Identical frames share one file. Recency is kept in memory and mirrored to file
+    mtimes, so the LRU order survives restarts.
+    """
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            key, ext = os.path.splitext(name)
+            if ext == ".jpg" and KEY_PATTERN.match(key):
+                stat = os.stat(os.path.join(directory, name))
+                files.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def put(self, data: bytes) -> str:
+        key = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return key
+        # Write to a temporary name first so readers never see a partial file
+        temporary = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+
+        # Renames and deletions happen under the lock, so an eviction can never remove a
+        # file that a concurrent put of the same frame has just (re)stored
+        with self._lock:
+            os.replace(temporary, self._path(key))
+            if key not in self._entries:
+                self._entries[key] = len(data)
+                self.total_bytes += len(data)
+            self._entries.move_to_end(key)
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+        return key
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Path of a stored frame, marking it recently used; None if unknown or evicted"""
+        if not KEY_PATTERN.match(key):
+            return None
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def externalize(self, value: Any, url_for: Callable[[str], str]) -> Any:
+        """Store every raw JPEG in a result and replace it with its URL"""
+        if isinstance(value, (bytes, bytearray)):
+            return url_for(self.put(bytes(value)))
+        if isinstance(value, dict):
+            return {key: self.externalize(item, url_for) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.externalize(item, url_for) for item in value]
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"frames": len(self._entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+def frame_response(path: str, key: str, headers) -> Response:
+    """Serve a stored frame with ETag/304 and single-range (206) support"""
+    response_headers = {"ETag": f'"{key}"', "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if headers.get("if-none-match") == f'"{key}"':
+        return Response(status_code=304, headers=response_headers)
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    match = RANGE_PATTERN.match(headers.get("range", "").strip())
+    if match is None:
+        return Response(content=data, media_type="image/jpeg", headers=response_headers)
+
+    start, end = _byte_range(match.group(1), match.group(2), len(data))
+    if start is None:
+        response_headers["Content-Range"] = f"bytes */{len(data)}"
+        return Response(status_code=416, headers=response_headers)
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(content=data[start:end + 1], status_code=206, media_type="image/jpeg", headers=response_headers)
+
+def _byte_range(first: str, last: str, size: int) -> Tuple[Optional[int], Optional[int]]:
+    if not first and not last:
+        return None, None
+    if not first:  # suffix range: the last N bytes
+        length = int(last)
+        return (max(0, size - length), size - 1) if length else (None, None)
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None, None
+    return start, end
+
+class ResultCache:
+    """Recent results by upload hash and request options, reused while their frames are stored"""
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(content: bytes, *options) -> Tuple:
+        return (hashlib.blake2b(content, digest_size=16).digest(), *options)
+
+    def get(self, key: Tuple, store: FrameStore) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            result, frame_keys = entry
+            if not all(store.contains(frame_key) for frame_key in frame_keys):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key: Tuple, result: Dict, frame_keys):
+        with self._lock:
+            self._entries[key] = (result, tuple(frame_keys))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,24 +1,41 @@
 import os
+import re
+import json
+import argparse
 import torch
 import torch.nn as nn
+import torchvision.models as models
 import h5py
-import tensorflow as tf
 import numpy as np
-from collections import OrderedDict
+from typing import Dict, List, Tuple
+from model import CATEGORIES
+
+INPUT_SIZE = 224
+BLOCK_PATTERN = re.compile(r"^(block\d+[a-z])_(.+)$")
+BACKBONE_PREFIXES = ("stem_", "block", "top_")
+
+class InputAffine(nn.Module):
+    """Per-channel scale and shift reproducing the Keras in-graph input preprocessing"""
+    def __init__(self):
+        super(InputAffine, self).__init__()
+        self.register_buffer("scale", torch.ones(1, 3, 1, 1))
+        self.register_buffer("shift", torch.zeros(1, 3, 1, 1))
+
+    def forward(self, x):
+        return x * self.scale + self.shift
 
 class RecycleNet(nn.Module):
+    """PyTorch mirror of the Keras RECYCLEX model (EfficientNet-B4 + residual dense head)
+
+    Takes RGB input in the 0-255 range, like the Keras model, and returns logits.
+    """
     def __init__(self, num_classes):
         super(RecycleNet, self).__init__()
-        # Load pre-trained EfficientNet
-        self.efficientnet = torch.hub.load('NVIDIA/DeepLearningExamples:torchhub', 'nvidia_efficientnet_b4', pretrained=True)
-        
-        # Freeze initial layers
-        for param in list(self.efficientnet.parameters())[:-30]:
-            param.requires_grad = False
-            
-        # Get number of features from the last layer
-        num_features = self.efficientnet.classifier.fc.in_features
-        
+        self.preprocess = InputAffine()
+        # Built offline: every weight is overwritten by the converted Keras weights
+        self.efficientnet = models.efficientnet_b4(pretrained=False)
+        num_features = self.efficientnet.classifier[1].in_features
+
         # Custom classifier
         self.global_pool = nn.AdaptiveAvgPool2d(1)
         self.fc1 = nn.Linear(num_features, 1024)
@@ -31,116 +48,271 @@ class RecycleNet(nn.Module):
         self.bn3 = nn.BatchNorm1d(256)
         self.dropout3 = nn.Dropout(0.3)
         self.classifier = nn.Linear(256, num_classes)
-        
+
         # Skip connections
         self.skip1 = nn.Linear(1024, 512)
         self.skip2 = nn.Linear(512, 256)
 
     def forward(self, x):
+        x = self.preprocess(x)
         features = self.efficientnet.features(x)
         x = self.global_pool(features)
         x = torch.flatten(x, 1)
-        
-        x1 = self.fc1(x)
-        x1 = self.bn1(x1)
-        x1 = nn.ReLU()(x1)
-        x1 = self.dropout1(x1)
-        
-        x2 = self.fc2(x1)
-        x2 = self.bn2(x2)
-        x2 = nn.ReLU()(x2)
-        x2 = self.dropout2(x2)
+
+        # Keras applies the ReLU inside Dense, before BatchNormalization
+        x1 = self.dropout1(self.bn1(torch.relu(self.fc1(x))))
+        x2 = self.dropout2(self.bn2(torch.relu(self.fc2(x1))))
         x2 = x2 + self.skip1(x1)
-        
-        x3 = self.fc3(x2)
-        x3 = self.bn3(x3)
-        x3 = nn.ReLU()(x3)
-        x3 = self.dropout3(x3)
+        x3 = self.dropout3(self.bn3(torch.relu(self.fc3(x2))))
         x3 = x3 + self.skip2(x2)
-        
-        output = self.classifier(x3)
-        return output
 
-def convert_model(h5_path, output_dir=None):
-    """
-    Convert H5 model to PyTorch format
-    
-    Args:
-        h5_path (str): Path to the H5 model file
-        output_dir (str, optional): Directory to save the converted model
-    """
-    try:
-        # Verify H5 file exists
-        if not os.path.exists(h5_path):
-            raise FileNotFoundError(f"H5 model not found at: {h5_path}")
-        
-        print(f"Loading H5 model from: {h5_path}")
-        
-        # Create output directory if specified
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, 'recyclex_model.pth')
+        return self.classifier(x3)
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+def _flatten_layers(layers: List[Dict]) -> List[Dict]:
+    """Expand nested Functional/Sequential models into one topologically ordered layer list"""
+    flat = []
+    for layer in layers:
+        if layer["class_name"] in ("Functional", "Model", "Sequential"):
+            flat.extend(_flatten_layers(layer["config"]["layers"]))
+        else:
+            flat.append(layer)
+    return flat
+
+def read_layer_graph(h5_file: h5py.File) -> List[Dict]:
+    """Read every layer config of the saved Keras model, including nested sub-models"""
+    raw_config = h5_file.attrs.get("model_config")
+    if raw_config is None:
+        raise ValueError("H5 file has no model_config; save the full model, not only its weights")
+    config = json.loads(_decode(raw_config))
+    return _flatten_layers(config["config"]["layers"])
+
+def read_layer_weights(h5_file: h5py.File) -> Dict[str, Dict[str, np.ndarray]]:
+    """Read all weights as {layer_name: {variable_name: array}}, descending into sub-models"""
+    root = h5_file["model_weights"] if "model_weights" in h5_file else h5_file
+    weights = {}
+    for group_name in root.attrs["layer_names"]:
+        group = root[_decode(group_name)]
+        for weight_name in group.attrs["weight_names"]:
+            weight_name = _decode(weight_name)
+            layer_name, variable = weight_name.split("/")[-2:]
+            weights.setdefault(layer_name, {})[variable.split(":")[0]] = group[weight_name][()]
+    return weights
+
+def _assign(param: torch.Tensor, array: np.ndarray, name: str):
+    if tuple(param.shape) != array.shape:
+        raise ValueError(f"Shape mismatch for {name}: PyTorch {tuple(param.shape)} vs Keras {array.shape}")
+    param.data.copy_(torch.from_numpy(np.ascontiguousarray(array, dtype=np.float32)))
+
+def _load_layer(module: nn.Module, weights: Dict[str, np.ndarray], config: Dict, name: str):
+    """Copy one Keras layer into its PyTorch counterpart with the layout transposes applied"""
+    if isinstance(module, nn.Conv2d):
+        if "depthwise_kernel" in weights:
+            # (kh, kw, in, multiplier) -> (in * multiplier, 1, kh, kw)
+            kernel = weights["depthwise_kernel"]
+            kernel = kernel.transpose(2, 3, 0, 1).reshape(-1, 1, *kernel.shape[:2])
+        else:
+            # (kh, kw, in, out) -> (out, in, kh, kw)
+            kernel = weights["kernel"].transpose(3, 2, 0, 1)
+        _assign(module.weight, kernel, name)
+        if "bias" in weights:
+            _assign(module.bias, weights["bias"], name)
+    elif isinstance(module, nn.Linear):
+        # (in, out) -> (out, in)
+        _assign(module.weight, weights["kernel"].T, name)
+        _assign(module.bias, weights["bias"], name)
+    elif isinstance(module, (nn.BatchNorm1d, nn.BatchNorm2d)):
+        size = module.num_features
+        _assign(module.weight, weights.get("gamma", np.ones(size)), name)
+        _assign(module.bias, weights.get("beta", np.zeros(size)), name)
+        _assign(module.running_mean, weights["moving_mean"], name)
+        _assign(module.running_var, weights["moving_variance"], name)
+        module.eps = config.get("epsilon", module.eps)
+    else:
+        raise TypeError(f"No conversion rule for {type(module).__name__} ({name})")
+
+def _backbone_targets(efficientnet: nn.Module, block_ids: List[str]) -> Dict[str, nn.Module]:
+    """Map Keras EfficientNet layer names to the torchvision modules holding their weights"""
+    targets = {
+        "stem_conv": efficientnet.features[0][0],
+        "stem_bn": efficientnet.features[0][1],
+        "top_conv": efficientnet.features[8][0],
+        "top_bn": efficientnet.features[8][1],
+    }
+    blocks = [block for stage in efficientnet.features[1:8] for block in stage]
+    if len(blocks) != len(block_ids):
+        raise ValueError(f"Keras model has {len(block_ids)} MBConv blocks, PyTorch has {len(blocks)}")
+
+    for block_id, block in zip(block_ids, blocks):
+        layers = list(block.block)
+        if len(layers) == 4:
+            expand, depthwise, squeeze_excitation, project = layers
+            targets[f"{block_id}_expand_conv"] = expand[0]
+            targets[f"{block_id}_expand_bn"] = expand[1]
         else:
-            output_dir = os.path.dirname(h5_path)
-            output_path = os.path.join(output_dir, 'recyclex_model.pth')
-        
-        # Initialize PyTorch model
-        print("Initializing PyTorch model...")
-        pytorch_model = RecycleNet(num_classes=6)  # 6 classes for RecycleX
-        
-        # Load H5 weights
-        print("Loading H5 weights...")
-        with h5py.File(h5_path, 'r') as h5_file:
-            # Convert weights
-            print("Converting weights...")
-            for name, layer in h5_file.items():
-                if isinstance(layer, h5py.Dataset):
-                    # Convert and assign weights
-                    weights = np.array(layer)
-                    if len(weights.shape) == 4:  # Conv layers
-                        weights = np.transpose(weights, (3, 2, 0, 1))
-                    elif len(weights.shape) == 2:  # Dense layers
-                        weights = np.transpose(weights)
-                    
-                    try:
-                        state_dict_key = f"layer.{name}"
-                        pytorch_model.state_dict()[state_dict_key].copy_(torch.from_numpy(weights))
-                    except KeyError:
-                        print(f"Warning: Could not find matching layer for {name}")
-        
-        # Save the converted model
-        print(f"Saving converted model to: {output_path}")
-        torch.save({
-            'model_state_dict': pytorch_model.state_dict(),
-            'num_classes': 6,
-            'input_size': 224,
-            'categories': ["cardboard", "glass", "metal", "paper", "plastic", "trash"]
-        }, output_path)
-        
-        print("Conversion completed successfully!")
-        return output_path
-        
-    except Exception as e:
-        print(f"Error during conversion: {str(e)}")
-        raise
+            depthwise, squeeze_excitation, project = layers
+        targets[f"{block_id}_dwconv"] = depthwise[0]
+        targets[f"{block_id}_bn"] = depthwise[1]
+        targets[f"{block_id}_se_reduce"] = squeeze_excitation.fc1
+        targets[f"{block_id}_se_expand"] = squeeze_excitation.fc2
+        targets[f"{block_id}_project_conv"] = project[0]
+        targets[f"{block_id}_project_bn"] = project[1]
+    return targets
+
+def _head_targets(model: RecycleNet, layers: List[Dict], weights: Dict) -> Dict[str, nn.Module]:
+    """Map the auto-named Keras head layers to RecycleNet modules by role and width"""
+    hidden = [model.fc1, model.fc2, model.fc3]
+    skips = {512: model.skip1, 256: model.skip2}
+    norms = {1024: model.bn1, 512: model.bn2, 256: model.bn3}
+    targets = {}
+    for layer in layers:
+        name, config = layer["config"]["name"], layer["config"]
+        if name.startswith(BACKBONE_PREFIXES):
+            continue
+        if layer["class_name"] == "Dense":
+            if config["activation"] == "relu":
+                targets[name] = hidden.pop(0)
+            elif config["activation"] == "softmax":
+                targets[name] = model.classifier
+            else:
+                targets[name] = skips[config["units"]]
+        elif layer["class_name"] == "BatchNormalization":
+            # BatchNormalization configs do not record their width, the weights do
+            targets[name] = norms[len(weights[name]["moving_mean"])]
+    return targets
+
+def _input_affine(layers: List[Dict], weights: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """Fold the Rescaling/Normalization layers in front of the stem into one affine map"""
+    scale, shift = np.ones(3, np.float32), np.zeros(3, np.float32)
+    for layer in layers:
+        config = layer["config"]
+        if layer["class_name"] == "Rescaling":
+            layer_scale = np.broadcast_to(np.asarray(config["scale"], np.float32), (3,))
+            layer_offset = np.broadcast_to(np.asarray(config.get("offset", 0.0), np.float32), (3,))
+            scale, shift = scale * layer_scale, shift * layer_scale + layer_offset
+        elif layer["class_name"] == "Normalization":
+            layer_weights = weights.get(config["name"], {})
+            mean = np.asarray(layer_weights.get("mean", config.get("mean")), np.float32).reshape(-1)
+            variance = np.asarray(layer_weights.get("variance", config.get("variance")), np.float32).reshape(-1)
+            std = np.maximum(np.sqrt(variance), 1e-7)
+            scale, shift = scale / std, (shift - mean) / std
+        elif layer["class_name"] in ("Conv2D", "ZeroPadding2D"):
+            break
+    return scale, shift
+
+def _apply_keras_padding(targets: Dict[str, nn.Module], layers: List[Dict], efficientnet: nn.Module):
+    """Replace symmetric padding with the asymmetric ZeroPadding2D Keras uses before strided convs"""
+    parents = {}
+    for parent in efficientnet.modules():
+        for child_name, child in parent.named_children():
+            parents[id(child)] = (parent, child_name)
+
+    for layer in layers:
+        if layer["class_name"] != "ZeroPadding2D":
+            continue
+        conv = targets[layer["config"]["name"][:-len("_pad")]]
+        (top, bottom), (left, right) = layer["config"]["padding"]
+        conv.padding = (0, 0)
+        parent, child_name = parents[id(conv)]
+        setattr(parent, child_name, nn.Sequential(nn.ZeroPad2d((left, right, top, bottom)), conv))
+
+def convert_model(h5_path: str) -> RecycleNet:
+    """Convert the Keras H5 model into an equivalent RecycleNet in eval mode"""
+    if not os.path.exists(h5_path):
+        raise FileNotFoundError(f"H5 model not found at: {h5_path}")
+
+    with h5py.File(h5_path, "r") as h5_file:
+        layers = read_layer_graph(h5_file)
+        weights = read_layer_weights(h5_file)
+
+    model = RecycleNet(num_classes=len(CATEGORIES))
+    block_ids = list(dict.fromkeys(
+        match.group(1) for match in (BLOCK_PATTERN.match(layer["config"]["name"]) for layer in layers) if match
+    ))
+
+    targets = _backbone_targets(model.efficientnet, block_ids)
+    targets.update(_head_targets(model, layers, weights))
+
+    configs = {layer["config"]["name"]: layer["config"] for layer in layers}
+    unmapped = []
+    for name, layer_weights in weights.items():
+        if name in targets:
+            _load_layer(targets[name], layer_weights, configs.get(name, {}), name)
+        elif "mean" not in layer_weights:  # Normalization weights are folded into the input affine
+            unmapped.append(name)
+    if unmapped:
+        raise ValueError(f"Keras layers without a PyTorch counterpart: {', '.join(unmapped)}")
+
+    scale, shift = _input_affine(layers, weights)
+    model.preprocess.scale.copy_(torch.from_numpy(scale).view(1, 3, 1, 1))
+    model.preprocess.shift.copy_(torch.from_numpy(shift).view(1, 3, 1, 1))
+
+    _apply_keras_padding(targets, layers, model.efficientnet)
+    return model.eval()
+
+def verify_parity(h5_path: str, model: nn.Module, num_samples: int = 8, seed: int = 0) -> Dict:
+    """Compare Keras and PyTorch softmax outputs on a batch of random 0-255 RGB inputs"""
+    import tensorflow as tf
+
+    keras_model = tf.keras.models.load_model(h5_path, compile=False)
+    rng = np.random.default_rng(seed)
+    inputs = rng.uniform(0, 255, size=(num_samples, INPUT_SIZE, INPUT_SIZE, 3)).astype(np.float32)
+
+    keras_probs = keras_model.predict(inputs, verbose=0)
+    with torch.no_grad():
+        torch_inputs = torch.from_numpy(inputs).permute(0, 3, 1, 2).contiguous()
+        torch_probs = torch.softmax(model(torch_inputs), dim=1).numpy()
+
+    return {
+        "num_samples": num_samples,
+        "max_abs_diff": float(np.abs(keras_probs - torch_probs).max()),
+        "top1_agreement": float((keras_probs.argmax(axis=1) == torch_probs.argmax(axis=1)).mean())
+    }
+
+def export_torchscript(model: nn.Module, output_path: str, metadata: Dict) -> str:
+    """Trace, freeze and optimize the converted model into a single TorchScript file"""
+    example = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+    with torch.no_grad():
+        traced = torch.jit.trace(model.eval(), example)
+        optimized = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    torch.jit.save(optimized, output_path, _extra_files={"metadata.json": json.dumps(metadata)})
+    return output_path
+
+def load_converted_model(path: str, device: torch.device) -> Tuple[torch.jit.ScriptModule, Dict]:
+    """Load an exported TorchScript artifact together with its metadata"""
+    extra_files = {"metadata.json": ""}
+    module = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+    return module, json.loads(extra_files["metadata.json"])
 
 if __name__ == "__main__":
-    # Model path from your system
-    h5_model_path = "/home/kasinadhsarma/Desktop/RecycleX/backend/TrashNet_Model.h5"
-    
-    try:
-        # Convert the model
-        output_path = convert_model(h5_model_path)
-        print(f"\nModel converted successfully and saved to: {output_path}")
-        
-        # Verify the converted model
-        print("\nVerifying converted model...")
-        loaded_model = torch.load(output_path)
-        print("Model verification successful!")
-        print("\nModel structure:")
-        print(f"Number of classes: {loaded_model['num_classes']}")
-        print(f"Input size: {loaded_model['input_size']}")
-        print(f"Categories: {loaded_model['categories']}")
-        
-    except Exception as e:
-        print(f"\nError: {str(e)}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert the Keras H5 model to a TorchScript artifact")
+    parser.add_argument("h5_path", nargs="?",
+                        default=os.path.join(os.path.dirname(__file__), "TrashNet_Model.h5"))
+    parser.add_argument("--output", default=None, help="Defaults to recyclex_model.pt next to the H5 file")
+    parser.add_argument("--parity-samples", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    parser.add_argument("--skip-parity", action="store_true", help="Skip the TensorFlow parity check")
+    args = parser.parse_args()
+
+    output_path = args.output or os.path.join(os.path.dirname(os.path.abspath(args.h5_path)), "recyclex_model.pt")
+
+    print(f"Converting H5 model from: {args.h5_path}")
+    converted = convert_model(args.h5_path)
+
+    metadata = {
+        "num_classes": len(CATEGORIES),
+        "input_size": INPUT_SIZE,
+        "input_format": "RGB, NCHW, float 0-255",
+        "categories": CATEGORIES
+    }
+    if not args.skip_parity:
+        parity = verify_parity(args.h5_path, converted, args.parity_samples)
+        print(f"Parity check: {parity}")
+        if parity["max_abs_diff"] > args.tolerance:
+            raise SystemExit(f"Parity check failed: max abs diff {parity['max_abs_diff']:.2e} > {args.tolerance:.0e}")
+        metadata["parity"] = parity
+
+    export_torchscript(converted, output_path, metadata)
+    print(f"Saved converted model to: {output_path}")
@@ -1,9 +1,76 @@
+import os
 import cv2
+import threading
 import numpy as np
 import base64
-from typing import Dict
+from typing import Dict, List, Optional, Union
 import tensorflow as tf
 from datetime import datetime
+from preprocessing import INPUT_SIZE, prepare_image
+
+class TFLiteClassifier:
+    """Batched TFLite interpreter (XNNPACK delegate) for the converted Keras model
+
+    The input tensor is resized to a fixed batch once and allocated up front; each call
+    copies its images into the pre-allocated buffer and invokes the interpreter per chunk.
+    """
+    def __init__(self, model_content: bytes, batch_size: int = 8, num_threads: Optional[int] = None):
+        self.batch_size = batch_size
+        self.interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=num_threads)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.interpreter.resize_tensor_input(self.input_index, [batch_size, INPUT_SIZE, INPUT_SIZE, 3])
+        self.interpreter.allocate_tensors()
+        self._input = np.zeros((batch_size, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32)
+        # A single interpreter is not safe to invoke from several threads at once
+        self._lock = threading.Lock()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Return softmax probabilities for a float32 NHWC batch of any size"""
+        outputs = []
+        with self._lock:
+            for start in range(0, len(batch), self.batch_size):
+                chunk = batch[start:start + self.batch_size]
+                self._input[:len(chunk)] = chunk
+                self.interpreter.set_tensor(self.input_index, self._input)
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self.output_index)[:len(chunk)].copy())
+        return np.concatenate(outputs)
+
+def convert_to_tflite(model: tf.keras.Model) -> bytes:
+    """Convert a Keras model to TFLite with float16 weights (compute stays float32 on CPU)"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+def load_tflite_classifier(
+    h5_path: str,
+    tflite_path: Optional[str] = None,
+    batch_size: int = 8,
+    num_threads: Optional[int] = None
+) -> TFLiteClassifier:
+    """Load the TFLite classifier, converting and caching it next to the H5 model when stale"""
+    tflite_path = tflite_path or os.path.splitext(h5_path)[0] + ".tflite"
+    if not os.path.exists(tflite_path) or os.path.getmtime(tflite_path) < os.path.getmtime(h5_path):
+        keras_model = tf.keras.models.load_model(h5_path, compile=False)
+        with open(tflite_path, "wb") as f:
+            f.write(convert_to_tflite(keras_model))
+
+    with open(tflite_path, "rb") as f:
+        return TFLiteClassifier(f.read(), batch_size=batch_size, num_threads=num_threads)
+
+def to_keras_batch(images: List[np.ndarray]) -> np.ndarray:
+    """Stack uint8 RGB model inputs into a float32 batch with EfficientNet preprocessing"""
+    batch = np.stack(images).astype(np.float32)
+    return tf.keras.applications.efficientnet.preprocess_input(batch)
+
+def predict_batch(model: Union[tf.keras.Model, TFLiteClassifier], batch: np.ndarray) -> np.ndarray:
+    """Run either backend on a preprocessed batch and return softmax probabilities"""
+    if isinstance(model, TFLiteClassifier):
+        return model.predict(batch)
+    # predict_on_batch skips the per-call data pipeline setup that predict() builds
+    return np.asarray(model.predict_on_batch(batch))
 
 def draw_detection_box(image: np.ndarray, class_name: str, confidence: float) -> np.ndarray:
     """Draw detection box and label on image with improved visibility"""
@@ -35,19 +102,15 @@ def draw_detection_box(image: np.ndarray, class_name: str, confidence: float) ->
         label, font, font_scale, thickness
     )
 
-    # Draw semi-transparent background for text
-    overlay = output_image.copy()
-    cv2.rectangle(
-        overlay,
-        (x1, y1 - label_height - 10),
-        (x1 + label_width + 10, y1),
-        (0, 255, 0),
-        -1
-    )
-    
-    # Apply overlay with transparency
+    # Blend the semi-transparent label background into its region only
     alpha = 0.7
-    cv2.addWeighted(overlay, alpha, output_image, 1 - alpha, 0, output_image)
+    top, bottom = max(y1 - label_height - 10, 0), min(y1 + 1, height)
+    left, right = max(x1, 0), min(x1 + label_width + 11, width)
+    roi = output_image[top:bottom, left:right]
+    if roi.size:
+        background = np.empty_like(roi)
+        background[:] = (0, 255, 0)
+        output_image[top:bottom, left:right] = cv2.addWeighted(background, alpha, roi, 1 - alpha, 0)
 
     # Draw white text
     cv2.putText(
@@ -63,56 +126,53 @@ def draw_detection_box(image: np.ndarray, class_name: str, confidence: float) ->
 
     return output_image
 
-def process_single_image(
-    image: np.ndarray,
-    model: tf.keras.Model,
+def process_batch(
+    images: List[np.ndarray],
+    model: Union[tf.keras.Model, TFLiteClassifier],
     categories: list,
-) -> Dict:
-    """Process a single image and return detection results with labeled image"""
+) -> List[Dict]:
+    """Classify several images in one invocation and return a labeled result for each"""
     try:
-        # Keep original image for drawing
-        original_image = image.copy()
-
-        # Preprocess image for model
-        processed_image = cv2.resize(image, (224, 224))
-        if len(processed_image.shape) == 2:
-            processed_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2RGB)
-        elif processed_image.shape[2] == 4:
-            processed_image = cv2.cvtColor(processed_image, cv2.COLOR_RGBA2RGB)
-        
-        processed_image = cv2.cvtColor(processed_image, cv2.COLOR_BGR2RGB)
-        processed_image = tf.keras.applications.efficientnet.preprocess_input(processed_image)
-        processed_image = np.expand_dims(processed_image, axis=0)
-
-        # Make prediction
-        prediction = model.predict(processed_image, verbose=0)
-        predicted_class = categories[np.argmax(prediction[0])]
-        confidence = float(np.max(prediction[0]))
-
-        # Draw detection box on original image
-        result_image = draw_detection_box(original_image, predicted_class, confidence)
-
-        # Convert to base64
-        _, buffer = cv2.imencode('.jpg', result_image, [cv2.IMWRITE_JPEG_QUALITY, 95])
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-
-        # Create result dictionary
-        result = {
-            "status": "success",
-            "predicted_class": predicted_class,
-            "confidence": confidence,
-            "processed_image": f"data:image/jpeg;base64,{image_base64}",
-            "timestamp": datetime.now().isoformat()
-        }
-
-        return result
+        # Preprocess all images for the model and predict them together
+        batch = to_keras_batch([prepare_image(image) for image in images])
+        predictions = predict_batch(model, batch)
+
+        results = []
+        for image, prediction in zip(images, predictions):
+            predicted_class = categories[int(np.argmax(prediction))]
+            confidence = float(np.max(prediction))
+
+            # Draw detection box on a copy of the original image
+            result_image = draw_detection_box(image, predicted_class, confidence)
+
+            # Convert to base64
+            _, buffer = cv2.imencode('.jpg', result_image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            image_base64 = base64.b64encode(buffer).decode('utf-8')
+
+            results.append({
+                "status": "success",
+                "predicted_class": predicted_class,
+                "confidence": confidence,
+                "processed_image": f"data:image/jpeg;base64,{image_base64}",
+                "timestamp": datetime.now().isoformat()
+            })
+
+        return results
 
     except Exception as e:
         raise Exception(f"Error processing image: {str(e)}")
 
+def process_single_image(
+    image: np.ndarray,
+    model: Union[tf.keras.Model, TFLiteClassifier],
+    categories: list,
+) -> Dict:
+    """Process a single image and return detection results with labeled image"""
+    return process_batch([image], model, categories)[0]
+
 def process_frame(
     frame: np.ndarray,
-    model: tf.keras.Model,
+    model: Union[tf.keras.Model, TFLiteClassifier],
     categories: list,
 ) -> Dict:
     """Process a video frame and return detection results"""
@@ -0,0 +1,329 @@
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+import cv2
+import numpy as np
+import torch
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from preprocessing import prepare_image
+from frame_filter import FrameFilter
+import tracing
+
+logger = logging.getLogger(__name__)
+
+def frame_hash(image: np.ndarray) -> bytes:
+    """Cheap perceptual hash: a coarse, quantized 16x16 grayscale thumbnail"""
+    small = cv2.resize(image, (16, 16), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return hashlib.blake2b((small >> 3).tobytes(), digest_size=8).digest()
+
+class StreamSession:
+    """Per-camera state tracked across the frames of one live stream"""
+    def __init__(self, stream_id: str, smoothing: float, frame_filter: Optional[FrameFilter] = None):
+        self.stream_id = stream_id
+        self.smoothing = smoothing
+        self.frame_filter = frame_filter
+        self.last_frame_hash = None
+        self.smoothed = None  # exponentially smoothed class probabilities
+        self.arrivals = deque(maxlen=30)
+        self.lag_ms = 0.0
+        self.min_interval = 0.0  # seconds between inferred frames, set by the manager
+        self.last_scheduled = 0.0
+        self.pending = None  # (prepared input, future, received_at)
+        self.last_probabilities = None  # softmax of the last inferred frame, before smoothing
+        self.last_batch = None  # (received_at, batch start, batch end, batch size) of the last inferred frame
+        self.frames_received = 0
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+        self.frames_dropped = 0  # dropped by the connection before reaching the manager
+
+    @property
+    def fps(self) -> float:
+        if len(self.arrivals) < 2:
+            return 0.0
+        return (len(self.arrivals) - 1) / max(self.arrivals[-1] - self.arrivals[0], 1e-6)
+
+    def update(self, probabilities: np.ndarray):
+        if self.smoothed is None:
+            self.smoothed = probabilities
+        else:
+            self.smoothed = self.smoothing * probabilities + (1 - self.smoothing) * self.smoothed
+
+    def label(self) -> Tuple[int, float]:
+        predicted = int(np.argmax(self.smoothed))
+        return predicted, float(self.smoothed[predicted])
+
+    def stats(self) -> Dict:
+        return {
+            "stream_id": self.stream_id,
+            "fps": round(self.fps, 2),
+            "lag_ms": round(self.lag_ms, 1),
+            "sample_interval_ms": round(self.min_interval * 1000, 1),
+            "frames_received": self.frames_received,
+            "frames_inferred": self.frames_inferred,
+            "frames_skipped": self.frames_skipped,
+            "frames_dropped": self.frames_dropped,
+            "frames_filtered": self.frame_filter.stats() if self.frame_filter else None
+        }
+
+class LiveSessionManager:
+    """Shares one inference engine fairly between many live streams
+
+    Each stream holds at most one pending frame (newer frames replace older ones), so a
+    batch takes the oldest pending frame of every stream: no stream can fill a batch on
+    its own. Measured batch throughput sets each stream's sample interval when the
+    combined frame rate exceeds what the node can infer.
+    """
+    def __init__(
+        self,
+        predict_func: Callable[[List[np.ndarray]], torch.Tensor],
+        max_batch_size: int = 16,
+        smoothing: float = 0.6,
+        executor: Optional[Executor] = None,
+        frame_filter_factory: Optional[Callable[[], FrameFilter]] = None
+    ):
+        self.predict_func = predict_func
+        self.executor = executor
+        self.frame_filter_factory = frame_filter_factory
+        self.max_batch_size = max_batch_size
+        self.smoothing = smoothing
+        self.sessions: Dict[str, StreamSession] = {}
+        self.capacity_fps = None  # frames per second the engine sustains, smoothed
+        self._wakeup = asyncio.Event()
+        self._scheduler = None
+
+    def open(self, stream_id: Optional[str] = None) -> StreamSession:
+        frame_filter = self.frame_filter_factory() if self.frame_filter_factory else None
+        session = StreamSession(stream_id or uuid.uuid4().hex[:8], self.smoothing, frame_filter)
+        self.sessions[session.stream_id] = session
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.get_running_loop().create_task(self._run())
+        return session
+
+    def close(self, session: StreamSession):
+        self.sessions.pop(session.stream_id, None)
+        if session.pending is not None and not session.pending[1].done():
+            session.pending[1].set_result(None)
+        session.pending = None
+        self._rebalance()
+
+    async def submit(self, session: StreamSession, image: np.ndarray) -> Optional[Tuple[int, float, bool]]:
+        """Queue a frame for inference and return (class index, confidence, inferred)
+
+        Frames identical to the previous one, arriving faster than the stream's sample
+        interval, or rejected by the stream's frame filter reuse the smoothed label
+        instead of being inferred. Returns None when the frame was skipped or superseded
+        before the stream had any prediction.
+        """
+        now = time.monotonic()
+        session.frames_received += 1
+        session.arrivals.append(now)
+
+        current_hash = frame_hash(image)
+        duplicate = current_hash == session.last_frame_hash
+        session.last_frame_hash = current_hash
+        if session.smoothed is not None and (duplicate or now - session.last_scheduled < session.min_interval):
+            session.frames_skipped += 1
+            return (*session.label(), False)
+
+        if session.frame_filter is not None and session.frame_filter.check(image) is not None:
+            session.frames_skipped += 1
+            return (*session.label(), False) if session.smoothed is not None else None
+
+        if session.pending is not None and not session.pending[1].done():
+            # A newer frame supersedes the queued one
+            session.pending[1].set_result(None)
+            session.frames_skipped += 1
+        future = asyncio.get_running_loop().create_future()
+        session.pending = (prepare_image(image), future, now)
+        session.last_scheduled = now
+        self._wakeup.set()
+
+        probabilities = await future
+        if probabilities is None:
+            return (*session.label(), False) if session.smoothed is not None else None
+        return (*session.label(), True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Oldest pending frame first across streams, one frame per stream
+            ready = sorted(
+                (s for s in self.sessions.values() if s.pending is not None and not s.pending[1].done()),
+                key=lambda s: s.pending[2]
+            )
+            batch_sessions = ready[:self.max_batch_size]
+            if len(ready) > len(batch_sessions):
+                self._wakeup.set()
+            if not batch_sessions:
+                continue
+
+            pending = [s.pending for s in batch_sessions]
+            for session in batch_sessions:
+                session.pending = None
+
+            start = time.monotonic()
+            try:
+                probabilities = await loop.run_in_executor(
+                    self.executor, self.predict_func, [prepared for prepared, _, _ in pending]
+                )
+            except Exception as e:
+                logger.error(f"Live batch inference failed: {e}")
+                for _, future, _ in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.monotonic()
+            self._record_throughput(len(pending), finished - start)
+            probabilities = probabilities.float().cpu().numpy()
+            for session, (_, future, received_at), row in zip(batch_sessions, pending, probabilities):
+                session.update(row)
+                session.last_probabilities = row
+                session.frames_inferred += 1
+                session.lag_ms = (finished - received_at) * 1000
+                session.last_batch = (received_at, start, finished, len(pending))
+                if not future.done():
+                    future.set_result(row)
+
+    def _record_throughput(self, batch_size: int, elapsed: float):
+        fps = batch_size / max(elapsed, 1e-6)
+        self.capacity_fps = fps if self.capacity_fps is None else 0.8 * self.capacity_fps + 0.2 * fps
+        self._rebalance()
+
+    def _rebalance(self):
+        """Spread the engine's capacity evenly when the streams ask for more than it can infer"""
+        if not self.sessions or self.capacity_fps is None:
+            return
+        demand = sum(session.fps for session in self.sessions.values())
+        interval = len(self.sessions) / self.capacity_fps if demand > self.capacity_fps else 0.0
+        for session in self.sessions.values():
+            session.min_interval = interval
+
+    def stats(self) -> Dict:
+        return {
+            "active_streams": len(self.sessions),
+            "capacity_fps": round(self.capacity_fps, 2) if self.capacity_fps else None,
+            "streams": [session.stats() for session in self.sessions.values()]
+        }
+
+class LiveConnection:
+    """The receive, inference and send tasks of one live connection, joined by bounded queues
+
+    The next frame is decoded and the previous result rendered and sent while a frame is
+    being inferred. When frames arrive faster than they can be inferred or sent, the
+    oldest waiting frame is dropped instead of delaying the newest. ``decode`` (message to
+    BGR image), ``render`` (image, class index, confidence, frame id, inferred to result)
+    and ``encode`` (result to message) run on ``executor``; a frame that fails any of them
+    is logged and skipped. Frame ids are the index of the frame's message on the connection.
+    """
+    def __init__(
+        self,
+        manager: LiveSessionManager,
+        session: StreamSession,
+        receive: Callable[[], Awaitable[Any]],
+        send: Callable[[Any], Awaitable[None]],
+        decode: Callable[[Any], np.ndarray],
+        render: Callable[[np.ndarray, int, float, int, bool], Any],
+        encode: Callable[[Any], Any],
+        on_inferred: Optional[Callable[[np.ndarray, np.ndarray, int, float], None]] = None,
+        executor: Optional[Executor] = None,
+        frame_queue_size: int = 2,
+        result_queue_size: int = 2,
+        message_format: str = "json"
+    ):
+        self.manager = manager
+        self.session = session
+        self.receive = receive
+        self.send = send
+        self.decode = decode
+        self.render = render
+        self.encode = encode
+        self.message_format = message_format  # recorded on encode spans
+        self.on_inferred = on_inferred
+        self.executor = executor
+        self.frames = asyncio.Queue(maxsize=frame_queue_size)
+        self.results = asyncio.Queue(maxsize=result_queue_size)
+
+    async def run(self):
+        """Run until ``receive`` or ``send`` raises (e.g. on disconnect), then cancel the other
+        tasks and re-raise that exception"""
+        loop = asyncio.get_running_loop()
+        tasks = [loop.create_task(stage()) for stage in (self._receive_frames, self._infer_frames, self._send_results)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # The stages only return by raising
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+
+    async def _receive_frames(self):
+        loop = asyncio.get_running_loop()
+        frame_id = -1
+        while True:
+            message = await self.receive()
+            frame_id += 1
+            tracing.start_trace()
+            try:
+                with tracing.span("decode", stream_id=self.session.stream_id):
+                    image = await loop.run_in_executor(self.executor, self.decode, message)
+            except Exception as e:
+                logger.warning(f"Dropping undecodable frame (stream {self.session.stream_id}): {e}")
+                continue
+            if self.frames.full():
+                self.frames.get_nowait()
+                self.session.frames_dropped += 1
+            self.frames.put_nowait((frame_id, image, tracing.current()))
+
+    async def _infer_frames(self):
+        session = self.session
+        while True:
+            frame_id, image, trace = await self.frames.get()
+            tracing.resume(trace)
+            try:
+                outcome = await self.manager.submit(session, image)
+            except Exception as e:
+                logger.error(f"Error processing frame (stream {session.stream_id}): {e}")
+                continue
+            if outcome is None:
+                continue
+            predicted, confidence, inferred = outcome
+            if inferred:
+                # Timed on the batching thread; attach them to this frame's trace
+                received_at, batch_start, batch_end, batch_size = session.last_batch
+                tracing.record("queue_wait", received_at, batch_start)
+                tracing.record("inference", batch_start, batch_end, batch_size=batch_size)
+                if self.on_inferred is not None:
+                    self.on_inferred(image, session.last_probabilities, predicted, confidence)
+            # Waits while the client reads slowly, which lets frames pile up and be dropped
+            await self.results.put((frame_id, image, predicted, confidence, inferred, trace))
+
+    async def _send_results(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            frame_id, image, predicted, confidence, inferred, trace = await self.results.get()
+            tracing.resume(trace)
+            try:
+                with tracing.span("render"):
+                    result = await loop.run_in_executor(
+                        self.executor, self.render, image, predicted, confidence, frame_id, inferred
+                    )
+                with tracing.span("encode", format=self.message_format):
+                    message = await loop.run_in_executor(self.executor, self.encode, result)
+            except Exception as e:
+                logger.error(f"Error rendering frame (stream {self.session.stream_id}): {e}")
+                continue
+            with tracing.span("send"):
+                await self.send(message)
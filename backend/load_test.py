@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import tempfile
+import subprocess
+import base64
+import struct
+import cv2
+import numpy as np
+import httpx
+import websockets
+from typing import Dict, List, Optional, Tuple
+
+def synthetic_image(width: int, height: int, seed: int) -> np.ndarray:
+    """Noise with a few filled shapes, so JPEG sizes resemble camera frames rather than flat colour"""
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    image = cv2.GaussianBlur(image, (0, 0), 3)
+    for _ in range(5):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        cv2.circle(image, center, int(rng.integers(10, max(11, min(width, height) // 3))), color, -1)
+    return image
+
+def encode_jpeg(image: np.ndarray) -> bytes:
+    _, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+    return buffer.tobytes()
+
+def unique_jpeg(payload: bytes, tag: int) -> bytes:
+    """The same image with a numbered JPEG comment, so the server's result cache never hits"""
+    comment = f"load-test {tag}".encode()
+    return payload[:2] + b"\xff\xfe" + struct.pack(">H", len(comment) + 2) + comment + payload[2:]
+
+def unique_mp4(payload: bytes, tag: int) -> bytes:
+    """The same clip with a numbered top-level ``free`` box, which players skip"""
+    comment = f"load-test {tag}".encode()
+    return payload + struct.pack(">I", len(comment) + 8) + b"free" + comment
+
+def synthetic_video(path: str, seconds: float, fps: int = 25, size: Tuple[int, int] = (640, 480)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    base = synthetic_image(size[0] + 200, size[1], seed=0)
+    for index in range(int(seconds * fps)):
+        # Pan across a wider image so consecutive frames differ
+        offset = index % 200
+        writer.write(np.ascontiguousarray(base[:, offset:offset + size[0]]))
+    writer.release()
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+# Every upload is made unique so /predict/image and /predict/video run the model instead of
+# answering from their result cache
+request_ids = itertools.count()
+
+class Recorder:
+    """Latencies, errors and counters of one traffic class"""
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def summary(self, duration: float) -> Dict:
+        latencies = np.array(self.latencies_ms)
+        row = {
+            "name": self.name,
+            "sent": self.sent,
+            "completed": len(latencies),
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "throughput_per_s": round(len(latencies) / duration, 2)
+        }
+        for percentile in (50, 95, 99):
+            value = float(np.percentile(latencies, percentile)) if len(latencies) else None
+            row[f"p{percentile}_ms"] = round(value, 1) if value is not None else None
+        return row
+
+async def image_client(client: httpx.AsyncClient, url: str, payloads: List[bytes], recorder: Recorder,
+                       deadline: float, params: Dict, headers: Dict):
+    index = 0
+    while time.monotonic() < deadline:
+        payload = unique_jpeg(payloads[index % len(payloads)], next(request_ids))
+        index += 1
+        recorder.sent += 1
+        start = time.monotonic()
+        try:
+            response = await client.post(f"{url}/predict/image", params=params, headers=headers,
+                                         files={"file": ("frame.jpg", payload, "image/jpeg")})
+            response.raise_for_status()
+            recorder.latencies_ms.append((time.monotonic() - start) * 1000)
+        except httpx.HTTPError:
+            recorder.errors += 1
+
+async def video_client(client: httpx.AsyncClient, url: str, video: bytes, recorder: Recorder,
+                       deadline: float, params: Dict, headers: Dict):
+    while time.monotonic() < deadline:
+        payload = unique_mp4(video, next(request_ids))
+        recorder.sent += 1
+        start = time.monotonic()
+        try:
+            response = await client.post(f"{url}/predict/video", params=params, headers=headers,
+                                         files={"file": ("clip.mp4", payload, "video/mp4")})
+            response.raise_for_status()
+            recorder.latencies_ms.append((time.monotonic() - start) * 1000)
+        except httpx.HTTPError:
+            recorder.errors += 1
+
+async def live_client(url: str, frames: List[str], fps: float, recorder: Recorder, deadline: float,
+                      drain_seconds: float = 2.0):
+    """Send frames at a fixed rate like the dashboard does and match replies by ``frame_id``
+
+    The server numbers frames by their message index on the connection and answers them in
+    order, so a reply also settles every earlier frame still waiting: those were dropped or
+    skipped. Frames still unanswered ``drain_seconds`` after the last send count as dropped.
+    """
+    ws_url = url.replace("http://", "ws://").replace("https://", "wss://") + "/predict/live"
+    in_flight: Dict[int, float] = {}  # frame id -> send time, in send order
+    try:
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            async def receive():
+                async for message in ws:
+                    frame_id = json.loads(message)["frame_id"]
+                    sent_at = in_flight.pop(frame_id, None)
+                    if sent_at is not None:
+                        recorder.latencies_ms.append((time.monotonic() - sent_at) * 1000)
+                    while in_flight and next(iter(in_flight)) < frame_id:
+                        del in_flight[next(iter(in_flight))]
+                        recorder.dropped += 1
+
+            receiver = asyncio.create_task(receive())
+            next_send = time.monotonic()
+            index = 0
+            while time.monotonic() < deadline:
+                in_flight[index] = time.monotonic()
+                await ws.send(frames[index % len(frames)])
+                recorder.sent += 1
+                index += 1
+                next_send += 1.0 / fps
+                await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+            drain_until = time.monotonic() + drain_seconds
+            while in_flight and time.monotonic() < drain_until:
+                await asyncio.sleep(0.05)
+            receiver.cancel()
+    except (OSError, websockets.WebSocketException):
+        recorder.errors += 1
+    recorder.dropped += len(in_flight)
+
+async def sample_rss(pid: Optional[int], deadline: float, interval: float, timeline: List[Dict], started: float):
+    while pid is not None and time.monotonic() < deadline:
+        timeline.append({"t": round(time.monotonic() - started, 1), "rss_mb": process_rss_mb(pid)})
+        await asyncio.sleep(interval)
+
+async def run(args, pid: Optional[int]) -> Dict:
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.image_sizes]
+    images = [encode_jpeg(synthetic_image(w, h, seed)) for seed, (w, h) in enumerate(sizes)]
+    live_frames = [
+        "data:image/jpeg;base64," + base64.b64encode(encode_jpeg(synthetic_image(640, 480, seed))).decode()
+        for seed in range(10)
+    ]
+    video = b""
+    if args.video_clients:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "clip.mp4")
+            synthetic_video(path, args.video_seconds)
+            with open(path, "rb") as f:
+                video = f.read()
+
+    params = {"tta_views": args.tta_views} if args.tta_views > 1 else {}
+    headers = {"Accept": args.accept, "Accept-Encoding": "gzip, br"}
+    recorders = {name: Recorder(name) for name in ("image", "video", "live")}
+    rss_timeline: List[Dict] = []
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    async with httpx.AsyncClient(timeout=args.timeout) as client:
+        tasks = [image_client(client, args.url, images, recorders["image"], deadline, params, headers)
+                 for _ in range(args.image_clients)]
+        tasks += [video_client(client, args.url, video, recorders["video"], deadline, params, headers)
+                  for _ in range(args.video_clients)]
+        tasks += [live_client(args.url, live_frames, args.live_fps, recorders["live"], deadline)
+                  for _ in range(args.live_streams)]
+        tasks.append(sample_rss(pid, deadline, args.rss_interval, rss_timeline, started))
+        await asyncio.gather(*tasks)
+    duration = time.monotonic() - started
+
+    rss = [point["rss_mb"] for point in rss_timeline if point["rss_mb"] is not None]
+    return {
+        "label": args.label,
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "duration_s": round(duration, 1),
+        "traffic": [recorder.summary(duration) for recorder in recorders.values() if recorder.sent],
+        "rss_mb": {"max": round(max(rss), 1), "last": round(rss[-1], 1)} if rss else None,
+        "rss_timeline": rss_timeline
+    }
+
+def start_server(port: int, env_overrides: List[str]) -> subprocess.Popen:
+    """Start the API with a randomly initialized model so the test needs no weights or network"""
+    env = dict(os.environ, RECYCLEX_RANDOM_WEIGHTS="1")
+    env.update(item.split("=", 1) for item in env_overrides)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env
+    )
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(1)
+    server.terminate()
+    raise RuntimeError("Server did not become healthy within 5 minutes")
+
+def print_report(report: Dict):
+    print(f"\n== {report['label']} ({report['duration_s']}s) ==")
+    print(f"{'traffic':<8}{'sent':>8}{'done':>8}{'err':>6}{'drop':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for row in report["traffic"]:
+        print(f"{row['name']:<8}{row['sent']:>8}{row['completed']:>8}{row['errors']:>6}{row['dropped']:>7}"
+              f"{row['throughput_per_s']:>9}{str(row['p50_ms']):>9}{str(row['p95_ms']):>9}{str(row['p99_ms']):>9}")
+    if report["rss_mb"]:
+        print(f"server RSS: max {report['rss_mb']['max']} MB, last {report['rss_mb']['last']} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay mixed image/video/live traffic against the API")
+    parser.add_argument("--url", default=None, help="Target a running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, default=None, help="PID of --url's server, for RSS sampling")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--env", nargs="*", default=[],
+                        help="KEY=VALUE settings for the started server, e.g. RECYCLEX_ADAPTIVE_MODE=resolution")
+    parser.add_argument("--label", default="baseline", help="Name of this run in the report")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--image-clients", type=int, default=4, help="Concurrent /predict/image uploaders")
+    parser.add_argument("--image-sizes", nargs="+", default=["320x240", "1280x720", "1920x1080"])
+    parser.add_argument("--video-clients", type=int, default=1)
+    parser.add_argument("--video-seconds", type=float, default=5.0)
+    parser.add_argument("--live-streams", type=int, default=8, help="Long-lived /predict/live WebSockets")
+    parser.add_argument("--live-fps", type=float, default=5.0)
+    parser.add_argument("--tta-views", type=int, default=1)
+    parser.add_argument("--accept", default="application/json", help="Accept header of HTTP requests")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--rss-interval", type=float, default=1.0)
+    parser.add_argument("--output", default=None, help="Append the JSON report to this file")
+    args = parser.parse_args()
+
+    server = None
+    pid = args.server_pid
+    if args.url is None:
+        server = start_server(args.port, args.env)
+        args.url = f"http://127.0.0.1:{args.port}"
+        pid = server.pid
+    try:
+        report = asyncio.run(run(args, pid))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    if args.output:
+        # One JSON object per line, so runs of different serving modes can be compared
+        with open(args.output, "a") as f:
+            f.write(json.dumps(report) + "\n")
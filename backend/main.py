@@ -1,21 +1,43 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, WebSocket
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
 import torch
-import torch.nn as nn
-import torchvision
-import torchvision.transforms as transforms
-import torchvision.models as models
 import numpy as np
 import cv2
 import os
+import time
+import asyncio
+import contextvars
 import logging
 import shutil
-from datetime import datetime
-from io import BytesIO
-from PIL import Image
+from datetime import datetime, timezone
+from typing import List, Optional
+from functools import partial
 import base64
+import pickle
 from video_processor import process_video
+from model import CATEGORIES, EfficientNetB4Custom, load_model
+from preprocessing import to_input_batch
+from decoding import ImageDecodeError, ImageTooLargeError, decode_image, decode_upload
+from cascade import FastClassifier, cascade_predict, load_threshold
+from tta import MAX_VIEWS, ViewBudget, tta_predict
+from adaptive import EarlyExitEfficientNet, adaptive_resolution_predict, load_exit_heads
+from live_sessions import LiveConnection, LiveSessionManager
+from stream_ingest import IngestionWorker, check_source_url
+from results_store import BUCKET_SECONDS, ResultsStore
+from ensemble import Ensemble, EnsembleMember, torchscript_predictor
+from frame_filter import FrameFilter
+from frame_store import FrameStore, ResultCache, frame_response
+from serialization import encode_response, negotiate_format, serialize
+from model_manager import LoadInProgressError, ModelManager, ModelVersion, NoCandidateError, file_digest
+from compression import PRUNED_SUFFIX, load_pruned_model
+from cpu_inference import CPUOptimizedModel, load_approved_settings
+from active_learning import SampleSelector
+from explain import ExplanationCache, grad_cam, render_heatmap
+from runtime_tuning import apply_plan, create_inference_executor, create_io_executor, load_plan
+from profiler import sample_stacks
+import tracing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -29,6 +51,84 @@ class Config:
     ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov'}
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    MAX_IMAGE_PIXELS = 50_000_000
+    DISPLAY_MAX_SIDE = 1280  # annotated images are returned at most this large
+    MODEL_DIR = os.path.dirname(os.path.abspath(__file__))  # reload/candidate files must live here
+    MODEL_PATH = os.path.join(os.path.dirname(__file__), "TrashNet_Model.pth")
+    # Serve a randomly initialized model (no weights files needed), e.g. for load_test.py
+    RANDOM_WEIGHTS = os.environ.get("RECYCLEX_RANDOM_WEIGHTS") == "1"
+    # Cascade: a fast model answers confident inputs, the rest are escalated to B4
+    CASCADE_ENABLED = True
+    FAST_MODEL_PATH = os.path.join(os.path.dirname(__file__), "TrashNet_Fast.pth")  # written by python cascade.py distill
+    CASCADE_CALIBRATION_PATH = os.path.join(os.path.dirname(__file__), "cascade_calibration.json")
+    CASCADE_THRESHOLD = 0.9  # used until the calibration tool has been run
+    # "pytorch" serves TrashNet_Model.pth; "tflite" serves the Keras model through TFLite;
+    # "ensemble" averages ENSEMBLE_MEMBERS run in parallel
+    SERVING_BACKEND = "pytorch"
+    KERAS_MODEL_PATH = os.path.join(os.path.dirname(__file__), "TrashNet_Model.h5")
+    TFLITE_BATCH_SIZE = 8
+    # kind: "pytorch" (the served model versions), "tflite" (H5 path) or "torchscript"
+    # (converted Keras model from h5topytorch.py); weights are normalized
+    ENSEMBLE_MEMBERS = [
+        {"kind": "pytorch", "weight": 0.5},
+        {"kind": "tflite", "path": os.path.join(os.path.dirname(__file__), "TrashNet_Model.h5"), "weight": 0.5},
+    ]
+    # Adaptive compute: None, "resolution" (low-res first pass) or "early_exit" (stage exit heads)
+    ADAPTIVE_MODE = os.environ.get("RECYCLEX_ADAPTIVE_MODE") or None
+    ADAPTIVE_LOW_RESOLUTION = 160
+    ADAPTIVE_THRESHOLD = 0.9
+    EXIT_HEADS_PATH = os.path.join(os.path.dirname(__file__), "TrashNet_ExitHeads.pth")
+    # Live streams share one batched inference engine
+    LIVE_MAX_BATCH_SIZE = 16
+    LIVE_SMOOTHING = 0.6  # weight of the newest frame in the smoothed label
+    # Per-connection queues between the receive, inference and send tasks
+    LIVE_FRAME_QUEUE_SIZE = 2
+    LIVE_RESULT_QUEUE_SIZE = 2
+    # Pre-filter that keeps dark, blurry and empty-belt frames from live/video inference;
+    # off by default because it changes which video frames are sampled
+    PREFILTER_ENABLED = os.environ.get("RECYCLEX_PREFILTER") == "1"
+    PREFILTER_SETTINGS = {
+        "min_brightness": 25.0,
+        "max_brightness": 230.0,
+        "blur_threshold": 30.0,  # Laplacian variance at 160px width
+        "min_occupancy": 0.02,  # fraction of pixels that differ from the learned background
+    }
+    # Server-side ingestion of RTSP/HTTP/file streams
+    STREAM_SAMPLE_INTERVAL = 0.5  # seconds between classified frames per source
+    STREAM_MAX_BATCH_SIZE = 16
+    STREAM_FILES_DIR = os.path.join(os.path.dirname(__file__), "stream_files")  # only local sources allowed
+    # Append-only prediction history for the analytics endpoints
+    RESULTS_DB_PATH = os.path.join(os.path.dirname(__file__), "results.db")
+    # Channels-last/bf16/fused Conv+BN on CPU, only for weights approved by cpu_inference.py
+    CPU_OPTIMIZED_INFERENCE = False
+    CPU_INFERENCE_REPORT_PATH = os.path.join(os.path.dirname(__file__), "cpu_inference_report.json")
+    # Uncertain production frames kept for labeling; export with active_learning.py
+    ACTIVE_LEARNING_DIR = os.path.join(os.path.dirname(__file__), "active_learning")
+    ACTIVE_LEARNING_CAPACITY = 2000
+    ACTIVE_LEARNING_METRIC = "margin"  # or "entropy"
+    # Rendered frames are served from a content-addressed disk store instead of inline
+    FRAME_STORE_DIR = os.path.join(os.path.dirname(__file__), "frames")
+    FRAME_STORE_MAX_BYTES = 512 * 1024 * 1024
+    RESULT_CACHE_SIZE = 256
+    # Core partitioning between inference and decode/encode; see runtime_tuning.py autotune
+    RUNTIME_TUNING_PATH = os.path.join(os.path.dirname(__file__), "runtime_tuning.json")
+    IO_CPU_FRACTION = 0.25
+    PIN_CPUS = False
+    EXPLANATION_CACHE_SIZE = 512  # heatmaps kept per model version and input
+    # Test-time augmentation: opt-in per request with ?tta_views=N
+    TTA_LATENCY_BUDGET_MS = None  # default budget when a request does not set tta_budget_ms
+    # Per-request spans (upload, decode, queue wait, inference, render, encode) in Chrome
+    # trace format for Perfetto; nothing is timed unless enabled
+    TRACING_ENABLED = os.environ.get("RECYCLEX_TRACING") == "1"
+    TRACE_PATH = os.path.join(os.path.dirname(__file__), "traces.json")
+    # GET /debug/profile samples all threads' stacks on demand
+    PROFILER_ENABLED = os.environ.get("RECYCLEX_PROFILER") == "1"
+
+# Thread pools must be sized before the first torch operation creates them
+runtime_plan = load_plan(Config.RUNTIME_TUNING_PATH, Config.IO_CPU_FRACTION)
+apply_plan(runtime_plan)
+inference_executor = create_inference_executor(runtime_plan, pin=Config.PIN_CPUS)
+io_executor = create_io_executor(runtime_plan, pin=Config.PIN_CPUS)
 
 app = FastAPI(
     title=Config.API_TITLE,
@@ -43,8 +143,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-CATEGORIES = ["cardboard", "glass", "metal", "paper", "plastic", "trash"]
+if Config.TRACING_ENABLED:
+    tracing.enable(Config.TRACE_PATH)
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        """Start a trace per request; clients may pass their own X-Trace-Id"""
+        trace_id = tracing.start_trace(request.headers.get("x-trace-id"))
+        with tracing.span("request", method=request.method, path=request.url.path):
+            response = await call_next(request)
+        response.headers["X-Trace-Id"] = trace_id
+        return response
+
 os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+results_store = ResultsStore(Config.RESULTS_DB_PATH)
+frame_store = FrameStore(Config.FRAME_STORE_DIR, Config.FRAME_STORE_MAX_BYTES)
+result_cache = ResultCache(Config.RESULT_CACHE_SIZE)
+sample_selector = SampleSelector(
+    Config.ACTIVE_LEARNING_DIR,
+    CATEGORIES,
+    capacity=Config.ACTIVE_LEARNING_CAPACITY,
+    metric=Config.ACTIVE_LEARNING_METRIC
+)
 
 def validate_file(file: UploadFile, allowed_extensions: set) -> tuple[bool, str]:
     """Validate uploaded file format and size"""
@@ -119,151 +239,558 @@ def draw_detection(image: np.ndarray, class_name: str, confidence: float) -> np.
 
     return image
 
-async def process_image(image: np.ndarray) -> dict:
-    """Process image and return detection results"""
+def predict_probabilities(
+    images: List[np.ndarray],
+    tta_views: int = 1,
+    tta_budget_ms: Optional[float] = None,
+    version: Optional[ModelVersion] = None
+) -> torch.Tensor:
+    """Return softmax probabilities for a list of prepared RGB model inputs
+
+    With ``tta_views`` > 1 the augmented views of every image run as one batch through
+    the full model and their probabilities are averaged. In ensemble mode every member
+    runs a plain forward pass instead, so TTA does not apply.
+    """
+    if ensemble is not None:
+        return ensemble.predict(images)
+    return predict_routed(images, tta_views, tta_budget_ms, version)
+
+def predict_routed(
+    images: List[np.ndarray],
+    tta_views: int = 1,
+    tta_budget_ms: Optional[float] = None,
+    version: Optional[ModelVersion] = None
+) -> torch.Tensor:
+    """Predict with the active or candidate model version and record its metrics
+
+    The version is routed per call unless the caller already picked one.
+    """
+    version = version or model_manager.route()
+    start = time.monotonic()
+    probabilities = _predict_with(version.model, images, tta_views, tta_budget_ms)
+    if tflite_model is None:
+        version.record((time.monotonic() - start) * 1000, probabilities)
+    return probabilities
+
+def _predict_with(
+    model: torch.nn.Module,
+    images: List[np.ndarray],
+    tta_views: int,
+    tta_budget_ms: Optional[float]
+) -> torch.Tensor:
+    if tflite_model is not None:
+        batch = torch.from_numpy(to_keras_batch(images)).permute(0, 3, 1, 2)
+        forward = lambda x: torch.from_numpy(tflite_model.predict(x.permute(0, 2, 3, 1).contiguous().numpy()))
+    else:
+        batch = to_input_batch(images, device)
+        forward = lambda x: torch.nn.functional.softmax(model(x), dim=1)
+
+    with torch.no_grad():
+        if tta_views > 1:
+            budget_ms = tta_budget_ms if tta_budget_ms is not None else Config.TTA_LATENCY_BUDGET_MS
+            return tta_predict(forward, batch, tta_views, tta_budget, budget_ms)
+        if tflite_model is None:
+            # Compute-saving strategies that need the PyTorch model
+            if fast_model is not None:
+                probabilities, escalated = cascade_predict(batch, fast_model, model, cascade_threshold)
+                logger.debug(f"Cascade escalated {int(escalated.sum())}/{len(batch)} inputs")
+                return probabilities
+            # Exit heads are trained on one backbone, so they only apply to that version
+            if early_exit_model is not None and early_exit_model.model is model:
+                return early_exit_model(batch, Config.ADAPTIVE_THRESHOLD)[0]
+            if Config.ADAPTIVE_MODE == "resolution":
+                return adaptive_resolution_predict(
+                    model, batch, Config.ADAPTIVE_LOW_RESOLUTION, Config.ADAPTIVE_THRESHOLD
+                )[0]
+        return forward(batch)
+
+def explain_probabilities(model_input: np.ndarray, version: Optional[ModelVersion] = None) -> tuple[torch.Tensor, bytes]:
+    """Probabilities and a Grad-CAM heatmap for one prepared input, from a single forward pass"""
+    version = version or model_manager.route()
+    key = explanation_cache.key(version.version, model_input)
+    cached = explanation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = time.monotonic()
+    probabilities, cams = grad_cam(version.model, to_input_batch([model_input], device))
+    version.record((time.monotonic() - start) * 1000, probabilities)
+    explanation = (probabilities[0], render_heatmap(cams[0]))
+    explanation_cache.put(key, explanation)
+    return explanation
+
+def render_result(image: np.ndarray, predicted_class: str, confidence: float) -> dict:
+    """Draw the detection on the original image and build the response payload"""
+    result_image = draw_detection(image, predicted_class, confidence)
+
+    # Raw JPEG bytes; serialization turns them into data URLs only for JSON clients
+    _, buffer = cv2.imencode('.jpg', result_image)
+
+    return {
+        "status": "success",
+        "predicted_class": predicted_class,
+        "confidence": confidence,
+        "processed_image": buffer.tobytes(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+async def process_image(
+    model_input: np.ndarray,
+    display: np.ndarray,
+    tta_views: int = 1,
+    tta_budget_ms: Optional[float] = None,
+    explain: bool = False,
+    offer_sample: bool = False,
+    version: Optional[ModelVersion] = None
+) -> dict:
+    """Classify a prepared model input and annotate the display-sized image
+
+    With ``offer_sample``, the display image is offered to the active-learning selector.
+    """
+    loop = asyncio.get_running_loop()
     try:
-        # Store original image for drawing
-        original_image = image.copy()
-
-        # Preprocess image for model
-        image = cv2.resize(image, (224, 224))
-        if len(image.shape) == 2:
-            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-        elif image.shape[2] == 4:
-            image = cv2.cvtColor(image, cv2.COLOR_RGBA2RGB)
-        
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image = transforms.ToTensor()(image)
-        image = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])(image)
-        image = image.unsqueeze(0).to(device)
-
-        # Make prediction
-        with torch.no_grad():
-            outputs = model(image)
-            _, predicted = torch.max(outputs, 1)
-            predicted_class = CATEGORIES[predicted.item()]
-            confidence = torch.nn.functional.softmax(outputs, dim=1)[0][predicted.item()].item()
-
-        # Draw detection on original image
-        result_image = draw_detection(original_image, predicted_class, confidence)
-
-        # Convert to base64
-        _, buffer = cv2.imencode('.jpg', result_image)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-
-        return {
-            "status": "success",
-            "predicted_class": predicted_class,
-            "confidence": confidence,
-            "processed_image": f"data:image/jpeg;base64,{image_base64}",
-            "timestamp": datetime.now().isoformat()
-        }
+        heatmap = None
+        with tracing.span("inference", explain=explain, tta_views=tta_views):
+            if explain:
+                probabilities, heatmap = await loop.run_in_executor(
+                    inference_executor, explain_probabilities, model_input, version
+                )
+            else:
+                probabilities = (await loop.run_in_executor(
+                    inference_executor, predict_probabilities, [model_input], tta_views, tta_budget_ms, version
+                ))[0]
+        predicted = int(torch.argmax(probabilities))
+        if offer_sample:
+            sample_selector.offer(display, probabilities.cpu().numpy())
+
+        # Drawing happens in place; the display image is not used afterwards
+        with tracing.span("render"):
+            result = await loop.run_in_executor(
+                io_executor, render_result, display, CATEGORIES[predicted], float(probabilities[predicted])
+            )
+        if heatmap is not None:
+            result["heatmap"] = heatmap
+        return result
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def predict_on_inference_pool(images: List[np.ndarray], **kwargs) -> torch.Tensor:
+    """predict_probabilities for worker threads: runs it on the inference pool and waits"""
+    return inference_executor.submit(predict_probabilities, images, **kwargs).result()
+
+def create_frame_filter() -> Optional[FrameFilter]:
+    return FrameFilter(**Config.PREFILTER_SETTINGS) if Config.PREFILTER_ENABLED else None
+
+live_sessions = LiveSessionManager(
+    predict_probabilities,
+    max_batch_size=runtime_plan["batch_size"] or Config.LIVE_MAX_BATCH_SIZE,
+    smoothing=Config.LIVE_SMOOTHING,
+    executor=inference_executor,
+    frame_filter_factory=create_frame_filter
+)
+
+def decode_frame(data: str) -> np.ndarray:
+    """Decode a base64 data-URL frame sent by the live client into a BGR image"""
+    return decode_image(base64.b64decode(data.split(',')[1]), Config.DISPLAY_MAX_SIDE, Config.MAX_IMAGE_PIXELS)
+
 @app.websocket("/predict/live")
-async def predict_live(websocket: WebSocket):
+async def predict_live(websocket: WebSocket, format: str = "json", camera_id: Optional[str] = None):
+    """Classify streamed frames; ?format=msgpack or cbor sends binary messages with raw JPEGs
+
+    Predictions are recorded under ``camera_id``, or the connection's stream id without one.
+
+    Receiving, inference and sending overlap (see LiveConnection). Replies carry
+    ``frame_id``, the index of the frame's message on this connection, so clients can
+    tell which frames were answered; frames without a reply were dropped or skipped.
+    """
+    response_format = negotiate_format(format)
     await websocket.accept()
-    logger.info("WebSocket connection established")
-    
+    session = live_sessions.open()
+    logger.info(f"WebSocket connection established (stream {session.stream_id})")
+
+    # Decode, render and encode run on the io pool so they never compete with inference threads
+    def render(image: np.ndarray, predicted: int, confidence: float, frame_id: int, inferred: bool) -> dict:
+        result = render_result(image, CATEGORIES[predicted], confidence)
+        result.update({"stream_id": session.stream_id, "frame_id": frame_id, "inferred": inferred})
+        return result
+
+    def encode(result: dict) -> bytes:
+        return serialize(result, response_format)[0]
+
+    async def send(body: bytes):
+        if response_format == "json":
+            await websocket.send_text(body.decode("utf-8"))
+        else:
+            await websocket.send_bytes(body)
+
+    def on_inferred(image: np.ndarray, probabilities: np.ndarray, predicted: int, confidence: float):
+        sample_selector.offer(image, probabilities)
+        results_store.record("live", camera_id or session.stream_id, CATEGORIES[predicted], confidence)
+
+    connection = LiveConnection(
+        live_sessions,
+        session,
+        websocket.receive_text,
+        send,
+        decode_frame,
+        render,
+        encode,
+        on_inferred,
+        executor=io_executor,
+        frame_queue_size=Config.LIVE_FRAME_QUEUE_SIZE,
+        result_queue_size=Config.LIVE_RESULT_QUEUE_SIZE,
+        message_format=response_format
+    )
     try:
-        while True:
-            try:
-                # Check if connection is closed before receiving
-                data = await websocket.receive_text()
-                
-                # Process the frame
-                img_bytes = base64.b64decode(data.split(',')[1])
-                img = Image.open(BytesIO(img_bytes))
-                image = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-                
-                result = await process_image(image)
-                await websocket.send_json(result)
-                
-            except RuntimeError as e:
-                if "disconnect" in str(e).lower():
-                    logger.info("Client disconnected")
-                    break
-                logger.error(f"Runtime error: {e}")
-                break
-                
-            except Exception as e:
-                logger.error(f"Error processing frame: {e}")
-                # Only continue if it's a processing error, not a connection error
-                if "disconnect" not in str(e).lower():
-                    continue
-                break
-    
+        await connection.run()
+    except WebSocketDisconnect:
+        logger.info(f"Client disconnected (stream {session.stream_id})")
+    except Exception as e:
+        logger.error(f"Live connection failed (stream {session.stream_id}): {e}")
     finally:
-        logger.info("WebSocket connection closed")
+        live_sessions.close(session)
+        logger.info(f"WebSocket connection closed (stream {session.stream_id})")
+
+async def externalize_frames(result: dict, request: Request) -> tuple[dict, list]:
+    """Move the result's JPEGs into the frame store and return it with URLs, plus the frame keys"""
+    keys = []
+    def url_for(key: str) -> str:
+        keys.append(key)
+        return str(request.url_for("get_frame", key=key))
+    result = await asyncio.get_running_loop().run_in_executor(io_executor, frame_store.externalize, result, url_for)
+    return result, keys
+
+@app.get("/frames/{key}.jpg")
+async def get_frame(key: str, request: Request):
+    """A rendered frame or thumbnail; immutable, so browsers cache it indefinitely"""
+    path = frame_store.get_path(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Frame not found")
+    return frame_response(path, key, request.headers)
+
+@app.get("/ensemble")
+async def ensemble_stats():
+    """Per-member and combined latency of the ensemble, and how often the members disagree"""
+    if ensemble is None:
+        raise HTTPException(status_code=404, detail="Ensemble serving is not enabled")
+    return ensemble.stats()
+
+@app.get("/active-learning")
+async def active_learning_stats():
+    """Size and score floor of the pool of uncertain frames kept for labeling"""
+    return sample_selector.stats()
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, le=120),
+    interval_ms: float = Query(5, ge=1, le=1000)
+):
+    """Sample every thread's stack for a while; returns collapsed stacks for a flamegraph"""
+    if not Config.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    stacks = await asyncio.get_running_loop().run_in_executor(None, sample_stacks, seconds, interval_ms / 1000)
+    return PlainTextResponse(stacks)
+
+@app.get("/live/sessions")
+async def live_session_stats():
+    """Per-stream frame rate, lag and sampling state of the active live sessions"""
+    return live_sessions.stats()
 
 @app.post("/predict/image")
-async def predict_image(file: UploadFile = File(...)):
-    """Process uploaded image with detection visualization"""
+async def predict_image(
+    request: Request,
+    file: UploadFile = File(...),
+    tta_views: int = Query(1, ge=1, le=MAX_VIEWS),
+    tta_budget_ms: Optional[float] = Query(None, gt=0),
+    camera_id: Optional[str] = Query(None),
+    explain: bool = Query(False),
+    inline_images: bool = Query(False)
+):
+    """Process uploaded image with detection visualization; ?explain=true adds a Grad-CAM heatmap
+
+    Images are returned as /frames URLs unless ?inline_images=true.
+    """
     try:
+        if explain and tflite_model is not None:
+            raise HTTPException(status_code=400, detail="Explanations need the PyTorch serving backend")
         # Validate file
         is_valid, error_message = validate_file(file, Config.ALLOWED_IMAGE_EXTENSIONS)
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_message)
 
-        content = await file.read()
-        image = cv2.imdecode(
-            np.frombuffer(content, np.uint8),
-            cv2.IMREAD_COLOR
-        )
-        if image is None:
-            raise HTTPException(status_code=400, detail="Could not read image")
+        with tracing.span("upload"):
+            content = await file.read()
+        # Route once, so the cache key names the version that produces (or produced) the result
+        version = model_manager.route()
+        cache_key = ResultCache.key(content, "image", tta_views, tta_budget_ms, explain, version.version)
+        cached = None if inline_images else result_cache.get(cache_key, frame_store)
+        if cached is not None:
+            results_store.record("image", camera_id, cached["predicted_class"], cached["confidence"])
+            return encode_response(dict(cached, timestamp=datetime.now().isoformat()), request.headers)
+
+        try:
+            with tracing.span("decode", bytes=len(content)):
+                model_input, display = await asyncio.get_running_loop().run_in_executor(
+                    io_executor, decode_upload, content, Config.DISPLAY_MAX_SIDE, Config.MAX_IMAGE_PIXELS
+                )
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ImageDecodeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        result = await process_image(image)
-        return JSONResponse(status_code=200, content=result)
+        result = await process_image(model_input, display, tta_views, tta_budget_ms, explain, True, version)
+        results_store.record("image", camera_id, result["predicted_class"], result["confidence"])
+        with tracing.span("encode"):
+            if not inline_images:
+                result, frame_keys = await externalize_frames(result, request)
+                result_cache.put(cache_key, result, frame_keys)
+            return encode_response(result, request.headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/predict/video")
 async def predict_video(
+    request: Request,
     background_tasks: BackgroundTasks,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    tta_views: int = Query(1, ge=1, le=MAX_VIEWS),
+    tta_budget_ms: Optional[float] = Query(None, gt=0),
+    camera_id: Optional[str] = Query(None),
+    inline_images: bool = Query(False)
 ):
-    """Process uploaded video with frame-by-frame detection"""
+    """Process uploaded video with frame-by-frame detection
+
+    Frames and thumbnails are returned as /frames URLs unless ?inline_images=true; a video
+    uploaded again with the same options is answered from the result cache.
+    """
     try:
         # Validate file
         is_valid, error_message = validate_file(file, Config.ALLOWED_VIDEO_EXTENSIONS)
         if not is_valid:
             raise HTTPException(status_code=400, detail=error_message)
 
+        with tracing.span("upload"):
+            content = await file.read()
+        version = model_manager.route()
+        cache_key = ResultCache.key(content, "video", tta_views, tta_budget_ms, version.version)
+        cached = None if inline_images else result_cache.get(cache_key, frame_store)
+        if cached is not None:
+            for frame in cached["processed_frames"]:
+                results_store.record("video", camera_id, frame["predicted_class"], frame["confidence"])
+            return encode_response(dict(cached, timestamp=datetime.now().isoformat()), request.headers)
+
         # Save file temporarily
-        content = await file.read()
         temp_path = os.path.join(Config.UPLOAD_FOLDER, f"temp_{file.filename}")
         with open(temp_path, "wb") as f:
             f.write(content)
 
-        # Process video
-        result = process_video(
+        # Decoding and rendering run on the io pool, the forward pass on the inference pool;
+        # the copied context carries the request's trace into the worker thread
+        result = await asyncio.get_running_loop().run_in_executor(
+            io_executor,
+            contextvars.copy_context().run,
+            process_video,
             temp_path,
-            model,
-            transforms.Compose([
-                transforms.ToPILImage(),
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-            ]),
-            CATEGORIES
+            partial(predict_on_inference_pool, tta_views=tta_views, tta_budget_ms=tta_budget_ms, version=version),
+            CATEGORIES,
+            create_frame_filter()
         )
+        for frame in result["processed_frames"]:
+            results_store.record("video", camera_id, frame["predicted_class"], frame["confidence"])
 
         # Schedule cleanup
         background_tasks.add_task(lambda: os.remove(temp_path))
 
-        return JSONResponse(status_code=200, content=result)
+        with tracing.span("encode"):
+            if not inline_images:
+                result, frame_keys = await externalize_frames(result, request)
+                result_cache.put(cache_key, result, frame_keys)
+            return encode_response(result, request.headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         if 'temp_path' in locals():
             background_tasks.add_task(lambda: os.remove(temp_path))
         raise HTTPException(status_code=500, detail=str(e))
 
+class StreamRequest(BaseModel):
+    url: str
+    source_id: Optional[str] = None
+    loop: bool = False  # loop local video files, for testing without a camera
+
+stream_worker = IngestionWorker(
+    predict_on_inference_pool,
+    CATEGORIES,
+    sample_interval=Config.STREAM_SAMPLE_INTERVAL,
+    max_batch_size=runtime_plan["batch_size"] or Config.STREAM_MAX_BATCH_SIZE,
+    on_result=lambda r: results_store.record("stream", r["source_id"], r["predicted_class"], r["confidence"])
+)
+
+@app.post("/streams")
+async def add_stream(request: StreamRequest):
+    """Start ingesting an RTSP/HTTP(S) camera stream, or a video file from STREAM_FILES_DIR"""
+    try:
+        url = check_source_url(request.url, Config.STREAM_FILES_DIR)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        source_id = stream_worker.add_source(url, request.source_id, request.loop)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "success", "source_id": source_id}
+
+@app.get("/streams")
+async def list_streams():
+    return {"streams": stream_worker.stats()}
+
+@app.delete("/streams/{source_id}")
+async def remove_stream(source_id: str):
+    try:
+        stream_worker.remove_source(source_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Stream {source_id} not found")
+    return {"status": "success"}
+
+@app.get("/streams/{source_id}/latest")
+async def latest_stream_result(source_id: str):
+    if source_id not in stream_worker.sources:
+        raise HTTPException(status_code=404, detail=f"Stream {source_id} not found")
+    return stream_worker.latest_results.get(source_id) or {"status": "pending"}
+
+@app.websocket("/streams/{source_id}/subscribe")
+async def subscribe_stream(websocket: WebSocket, source_id: str):
+    """Push every new classification of a server-side stream to the client"""
+    await websocket.accept()
+    try:
+        queue = stream_worker.subscribe(source_id)
+    except KeyError:
+        await websocket.close(code=4404)
+        return
+
+    try:
+        while True:
+            result = await queue.get()
+            if result is None:
+                await websocket.close()
+                break
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        logger.info(f"Subscriber of stream {source_id} disconnected")
+    finally:
+        stream_worker.unsubscribe(source_id, queue)
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    stream_worker.stop()
+    results_store.close()
+    sample_selector.close()
+    if ensemble is not None:
+        ensemble.close()
+    tracing.disable()
+
+def _utc_timestamp(value: datetime) -> float:
+    """Epoch seconds of a query bound; bounds without a UTC offset are taken as UTC, like the buckets"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _time_range(start: Optional[datetime], end: Optional[datetime]) -> tuple[float, float]:
+    end_ts = _utc_timestamp(end) if end else time.time()
+    start_ts = _utc_timestamp(start) if start else end_ts - 86400
+    return start_ts, end_ts
+
+@app.get("/analytics/classes")
+async def class_histogram(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    bucket: str = Query("hour", pattern="^(hour|day)$"),
+    camera_id: Optional[str] = None,
+    source: Optional[str] = None
+):
+    """Per-class prediction counts in hourly or daily buckets (defaults to the last 24 hours)"""
+    start_ts, end_ts = _time_range(start, end)
+    return {
+        "bucket_seconds": BUCKET_SECONDS[bucket],
+        "buckets": results_store.class_histogram(start_ts, end_ts, bucket, camera_id, source)
+    }
+
+@app.get("/analytics/confidence")
+async def confidence_distribution(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    camera_id: Optional[str] = None,
+    source: Optional[str] = None,
+    predicted_class: Optional[str] = None
+):
+    """Per-class confidence histograms over ten equal-width bins"""
+    start_ts, end_ts = _time_range(start, end)
+    return {
+        "histograms": results_store.confidence_distribution(start_ts, end_ts, camera_id, source, predicted_class)
+    }
+
+class ModelRequest(BaseModel):
+    filename: str = os.path.basename(Config.MODEL_PATH)
+    fraction: float = 0.1  # share of batches sent to a candidate
+
+def _model_path(filename: str) -> str:
+    path = os.path.join(Config.MODEL_DIR, filename)
+    if os.path.dirname(os.path.abspath(path)) != Config.MODEL_DIR or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Model file {filename} not found")
+    return path
+
+async def _load_in_background(load, *args):
+    """Load on a worker thread so serving, including live sessions, carries on meanwhile"""
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, load, *args)
+    except LoadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (RuntimeError, ValueError, KeyError, pickle.UnpicklingError) as e:
+        # load_state_dict key/shape mismatches and unreadable checkpoints
+        logger.error(f"Model load failed: {e}")
+        raise HTTPException(status_code=422, detail=f"Could not load model: {e}")
+    except Exception as e:
+        logger.error(f"Model load failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/models")
+async def model_versions():
+    """Active and candidate model versions with their latency and class-distribution metrics"""
+    return model_manager.stats()
+
+@app.post("/models/reload")
+async def reload_model(request: ModelRequest):
+    """Load, warm up and atomically swap in a new version of the served model"""
+    version = await _load_in_background(model_manager.activate, _model_path(request.filename))
+    return {"status": "success", "active": version.version}
+
+@app.post("/models/candidate")
+async def set_candidate_model(request: ModelRequest):
+    """Serve a candidate model to ``fraction`` of the prediction batches for comparison"""
+    if not 0.0 <= request.fraction <= 1.0:
+        raise HTTPException(status_code=400, detail="fraction must be between 0 and 1")
+    version = await _load_in_background(model_manager.set_candidate, _model_path(request.filename), request.fraction)
+    return {"status": "success", "candidate": version.version, "fraction": request.fraction}
+
+@app.post("/models/candidate/promote")
+async def promote_candidate_model():
+    try:
+        version = model_manager.promote_candidate()
+    except NoCandidateError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "success", "active": version.version}
+
+@app.delete("/models/candidate")
+async def clear_candidate_model():
+    model_manager.clear_candidate()
+    return {"status": "success"}
+
 @app.get("/health")
 async def health_check():
     return {
@@ -272,42 +799,83 @@ async def health_check():
         "version": Config.API_VERSION
     }
 
+def load_serving_model(path: str) -> torch.nn.Module:
+    """Load full or pruned weights, in the optimized CPU mode if a parity report approved them"""
+    if path.endswith(PRUNED_SUFFIX):
+        model = load_pruned_model(path, len(CATEGORIES), device)
+    else:
+        model = load_model(EfficientNetB4Custom, path, device)
+    if Config.CPU_OPTIMIZED_INFERENCE and device.type == "cpu":
+        try:
+            settings = load_approved_settings(Config.CPU_INFERENCE_REPORT_PATH, file_digest(path))
+            logger.info(f"Serving {os.path.basename(path)} with {settings}")
+            return CPUOptimizedModel(model, **settings)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Serving {os.path.basename(path)} in float32: {e}")
+    return model
+
 # Load the PyTorch model
 print("Loading model...")
 try:
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model_path = os.path.join(os.path.dirname(__file__), "TrashNet_Model.pth")
-    
-    class EfficientNetB4Custom(nn.Module):
-        def __init__(self, num_classes):
-            super(EfficientNetB4Custom, self).__init__()
-            self.base_model = models.efficientnet_b4(pretrained=True)
-            self.base_model.classifier = nn.Sequential(
-                nn.Linear(1792, 1024),
-                nn.ReLU(),
-                nn.BatchNorm1d(1024),
-                nn.Dropout(0.5),
-                nn.Linear(1024, 512),
-                nn.ReLU(),
-                nn.BatchNorm1d(512),
-                nn.Dropout(0.4),
-                nn.Linear(512, 256),
-                nn.ReLU(),
-                nn.BatchNorm1d(256),
-                nn.Dropout(0.3),
-                nn.Linear(256, num_classes)
-            )
+    if Config.RANDOM_WEIGHTS:
+        load_func = lambda path: EfficientNetB4Custom(len(CATEGORIES), pretrained=False).to(device).eval()
+    else:
+        load_func = load_serving_model
+    model_manager = ModelManager(load_func, device, CATEGORIES)
+    model_manager.activate(Config.MODEL_PATH)
+    print(f"Model {model_manager.active.version} loaded successfully")
 
-        def forward(self, x):
-            return self.base_model(x)
+    fast_model = None
+    cascade_threshold = load_threshold(Config.CASCADE_CALIBRATION_PATH, Config.CASCADE_THRESHOLD)
+    if Config.CASCADE_ENABLED and os.path.exists(Config.FAST_MODEL_PATH):
+        fast_model = load_model(FastClassifier, Config.FAST_MODEL_PATH, device)
+        print(f"Cascade enabled with threshold {cascade_threshold:.3f}")
 
-    model = EfficientNetB4Custom(num_classes=len(CATEGORIES)).to(device)
-    if os.path.exists(model_path):
-        model.load_state_dict(torch.load(model_path, map_location=device))
-        model.eval()
-        print("Model loaded successfully")
-    else:
-        raise FileNotFoundError("Model file not found.")
+    tta_budget = ViewBudget()
+    explanation_cache = ExplanationCache(Config.EXPLANATION_CACHE_SIZE)
+
+    early_exit_model = None
+    if Config.ADAPTIVE_MODE == "early_exit":
+        early_exit_model = load_exit_heads(
+            EarlyExitEfficientNet(model_manager.active.model, len(CATEGORIES)), Config.EXIT_HEADS_PATH, device
+        )
+        print(f"Early-exit inference enabled with threshold {Config.ADAPTIVE_THRESHOLD:.2f}")
+
+    uses_tflite = Config.SERVING_BACKEND == "tflite" or (
+        Config.SERVING_BACKEND == "ensemble" and any(spec["kind"] == "tflite" for spec in Config.ENSEMBLE_MEMBERS)
+    )
+    if uses_tflite:
+        # Imported lazily so the PyTorch backend does not pay for loading TensorFlow
+        from image_processor import load_tflite_classifier, to_keras_batch
+
+    tflite_model = None
+    if Config.SERVING_BACKEND == "tflite":
+        tflite_model = load_tflite_classifier(Config.KERAS_MODEL_PATH, batch_size=Config.TFLITE_BATCH_SIZE)
+        print("Serving the Keras model through TFLite")
+
+    ensemble = None
+    if Config.SERVING_BACKEND == "ensemble":
+        # Members run at the same time, so they split the inference cores between them
+        member_threads = max(1, runtime_plan["inference_threads"] // len(Config.ENSEMBLE_MEMBERS))
+        torch.set_num_threads(member_threads)
+        members = []
+        for spec in Config.ENSEMBLE_MEMBERS:
+            if spec["kind"] == "pytorch":
+                member_predict = predict_routed
+            elif spec["kind"] == "tflite":
+                classifier = load_tflite_classifier(
+                    spec["path"], batch_size=Config.TFLITE_BATCH_SIZE, num_threads=member_threads
+                )
+                member_predict = lambda images, classifier=classifier: classifier.predict(to_keras_batch(images))
+            elif spec["kind"] == "torchscript":
+                from h5topytorch import load_converted_model
+                member_predict = torchscript_predictor(load_converted_model(spec["path"], device)[0], device)
+            else:
+                raise ValueError(f"Unknown ensemble member kind: {spec['kind']}")
+            members.append(EnsembleMember(spec.get("name", spec["kind"]), member_predict, spec["weight"]))
+        ensemble = Ensemble(members)
+        print(f"Ensemble serving with {', '.join(m.name for m in members)} ({member_threads} threads each)")
 except Exception as e:
     print(f"Error loading model: {e}")
     raise HTTPException(status_code=500, detail=f"Failed to load model: {str(e)}")
@@ -0,0 +1,40 @@
+import os
+import torch
+import torch.nn as nn
+import torchvision.models as models
+
+CATEGORIES = ["cardboard", "glass", "metal", "paper", "plastic", "trash"]
+
+class EfficientNetB4Custom(nn.Module):
+    def __init__(self, num_classes, pretrained=True):
+        super(EfficientNetB4Custom, self).__init__()
+        self.base_model = models.efficientnet_b4(pretrained=pretrained)
+        self.base_model.classifier = nn.Sequential(
+            nn.Linear(1792, 1024),
+            nn.ReLU(),
+            nn.BatchNorm1d(1024),
+            nn.Dropout(0.5),
+            nn.Linear(1024, 512),
+            nn.ReLU(),
+            nn.BatchNorm1d(512),
+            nn.Dropout(0.4),
+            nn.Linear(512, 256),
+            nn.ReLU(),
+            nn.BatchNorm1d(256),
+            nn.Dropout(0.3),
+            nn.Linear(256, num_classes)
+        )
+
+    def forward(self, x):
+        return self.base_model(x)
+
+def load_model(model_class, model_path: str, device: torch.device) -> nn.Module:
+    """Build a model from its class, load the trained state dict and put it in eval mode"""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    # The state dict overwrites every weight, so skip downloading ImageNet weights
+    model = model_class(num_classes=len(CATEGORIES), pretrained=False).to(device)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.eval()
+    return model
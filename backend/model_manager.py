@@ -0,0 +1,162 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+import numpy as np
+import torch
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from preprocessing import INPUT_SIZE
+
+logger = logging.getLogger(__name__)
+
+class LoadInProgressError(RuntimeError):
+    pass
+
+class NoCandidateError(RuntimeError):
+    pass
+
+def file_digest(path: str) -> str:
+    """Short SHA-256 of a weights file, so the same file always gets the same version id"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+class ModelVersion:
+    """One loaded model and the latency/class metrics of the traffic it served"""
+    def __init__(self, model: torch.nn.Module, path: str, num_classes: int, latency_window: int = 1000):
+        self.model = model
+        self.path = path
+        digest = file_digest(path) if os.path.exists(path) else "untrained"
+        self.version = f"{os.path.basename(path)}@{digest}"
+        self.loaded_at = time.time()
+        self.batches = 0
+        self.images = 0
+        self.class_counts = np.zeros(num_classes, dtype=np.int64)
+        self.latencies_ms = deque(maxlen=latency_window)  # per-batch, most recent only
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, probabilities: torch.Tensor):
+        predicted = probabilities.argmax(dim=1).cpu().numpy()
+        with self._lock:
+            self.batches += 1
+            self.images += len(predicted)
+            self.class_counts += np.bincount(predicted, minlength=len(self.class_counts))
+            self.latencies_ms.append(latency_ms)
+
+    def stats(self, categories: List[str]) -> Dict:
+        with self._lock:
+            latencies = np.array(self.latencies_ms)
+            counts = self.class_counts.copy()
+            batches, images = self.batches, self.images
+        return {
+            "version": self.version,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "batches": batches,
+            "images": images,
+            "p50_batch_latency_ms": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+            "p95_batch_latency_ms": round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None,
+            "class_distribution": {
+                name: round(int(count) / images, 4) if images else 0.0 for name, count in zip(categories, counts)
+            }
+        }
+
+class ModelManager:
+    """Serves an active model, optionally sending a fraction of batches to a candidate
+
+    New versions are loaded and warmed up before they are swapped in with a single
+    reference assignment, so in-flight batches finish on the version they started with
+    and no request ever sees a cold or half-loaded model.
+    """
+    def __init__(
+        self,
+        load_func: Callable[[str], torch.nn.Module],
+        device: torch.device,
+        categories: List[str],
+        warmup_batches: int = 2,
+        history_size: int = 5
+    ):
+        self.load_func = load_func
+        self.device = device
+        self.categories = categories
+        self.warmup_batches = warmup_batches
+        self.active: Optional[ModelVersion] = None
+        self.candidate: Optional[ModelVersion] = None
+        self.candidate_fraction = 0.0
+        self.retired = deque(maxlen=history_size)  # stats of replaced versions
+        self._load_lock = threading.Lock()
+
+    @property
+    def loading(self) -> bool:
+        return self._load_lock.locked()
+
+    def load_version(self, path: str) -> ModelVersion:
+        """Load and warm up a version without serving it; only one load runs at a time"""
+        if not self._load_lock.acquire(blocking=False):
+            raise LoadInProgressError("Another model version is already loading")
+        try:
+            start = time.monotonic()
+            version = ModelVersion(self.load_func(path), path, len(self.categories))
+            # The first batches pay for allocator growth and kernel selection
+            with torch.no_grad():
+                for _ in range(self.warmup_batches):
+                    version.model(torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE, device=self.device))
+            logger.info(f"Loaded model {version.version} in {time.monotonic() - start:.1f}s")
+            return version
+        finally:
+            self._load_lock.release()
+
+    def activate(self, path: str) -> ModelVersion:
+        version = self.load_version(path)
+        if self.active is not None:
+            self.retired.append(self.active.stats(self.categories))
+        self.active = version
+        return version
+
+    def set_candidate(self, path: str, fraction: float) -> ModelVersion:
+        version = self.load_version(path)
+        if self.candidate is not None:
+            self.retired.append(self.candidate.stats(self.categories))
+        self.candidate_fraction = 0.0
+        self.candidate = version
+        self.candidate_fraction = fraction
+        return version
+
+    def clear_candidate(self):
+        self.candidate_fraction = 0.0
+        if self.candidate is not None:
+            self.retired.append(self.candidate.stats(self.categories))
+        self.candidate = None
+
+    def promote_candidate(self) -> ModelVersion:
+        """Make the candidate the active version; it keeps the metrics gathered so far"""
+        candidate = self.candidate
+        if candidate is None:
+            raise NoCandidateError("No candidate model to promote")
+        self.candidate_fraction = 0.0
+        self.candidate = None
+        self.retired.append(self.active.stats(self.categories))
+        self.active = candidate
+        return candidate
+
+    def route(self) -> ModelVersion:
+        """Pick the version for the next batch"""
+        candidate = self.candidate
+        if candidate is not None and random.random() < self.candidate_fraction:
+            return candidate
+        return self.active
+
+    def stats(self) -> Dict:
+        candidate = self.candidate
+        return {
+            "loading": self.loading,
+            "active": self.active.stats(self.categories) if self.active else None,
+            "candidate": candidate.stats(self.categories) if candidate else None,
+            "candidate_fraction": self.candidate_fraction,
+            "retired": list(self.retired)
+        }
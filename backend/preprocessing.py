@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+import torch
+from typing import List
+
+INPUT_SIZE = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+def prepare_image(image: np.ndarray, size: int = INPUT_SIZE) -> np.ndarray:
+    """Convert a decoded BGR/gray/BGRA image to a uint8 RGB model input"""
+    if len(image.shape) == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    elif image.shape[2] == 4:
+        image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+    image = cv2.resize(image, (size, size))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def to_input_batch(images: List[np.ndarray], device: torch.device) -> torch.Tensor:
+    """Stack uint8 RGB images into one normalized NCHW float batch"""
+    batch = torch.from_numpy(np.stack(images)).to(device)
+    batch = batch.permute(0, 3, 1, 2).float().div_(255.0)
+    mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1)
+    return batch.sub_(mean).div_(std)
@@ -0,0 +1,167 @@
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+from contextlib import closing
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_BINS = 10
+BUCKET_SECONDS = {"hour": 3600, "day": 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    predicted_class TEXT NOT NULL,
+    confidence REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictions_ts ON predictions (ts);
+CREATE INDEX IF NOT EXISTS predictions_camera_ts ON predictions (camera, ts);
+
+-- Hourly partitions of the predictions, kept up to date on every write, so analytics
+-- queries scan at most one row per hour/camera/class/bin instead of raw predictions
+CREATE TABLE IF NOT EXISTS hourly_rollup (
+    hour INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    camera TEXT NOT NULL,
+    predicted_class TEXT NOT NULL,
+    confidence_bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    PRIMARY KEY (hour, camera, source, predicted_class, confidence_bin)
+) WITHOUT ROWID;
+"""
+
+class ResultsStore:
+    """Append-only SQLite store of predictions, written in batches by a background thread
+
+    ``record`` only enqueues, so the predict paths never wait on disk. When the queue is
+    full the record is dropped and counted rather than blocking a request.
+    """
+    def __init__(self, db_path: str, flush_interval: float = 1.0, max_batch: int = 1000, queue_size: int = 100000):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._read_lock = threading.Lock()
+
+        # A connection's own context manager only commits; closing() releases it
+        with closing(self._connect()) as connection:
+            connection.executescript(SCHEMA)
+        self._reader = self._connect()
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._run, name="results-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, source: str, camera: Optional[str], predicted_class: str, confidence: float,
+               timestamp: Optional[float] = None):
+        try:
+            self._queue.put_nowait((timestamp or time.time(), source, camera or "", predicted_class, confidence))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._stopped.set()
+        self._writer.join()
+        self._reader.close()
+
+    def _run(self):
+        connection = self._connect()
+        while not (self._stopped.is_set() and self._queue.empty()):
+            try:
+                rows = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(rows) < self.max_batch:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(connection, rows)
+            except sqlite3.Error as e:
+                logger.error(f"Failed to store {len(rows)} prediction results: {e}")
+        connection.close()
+
+    def _write(self, connection: sqlite3.Connection, rows: List[tuple]):
+        # Aggregate the batch in memory so each rollup row is upserted once
+        rollup = defaultdict(lambda: [0, 0.0])
+        for ts, source, camera, predicted_class, confidence in rows:
+            confidence_bin = min(int(confidence * CONFIDENCE_BINS), CONFIDENCE_BINS - 1)
+            entry = rollup[(int(ts // 3600), source, camera, predicted_class, confidence_bin)]
+            entry[0] += 1
+            entry[1] += confidence
+
+        with connection:
+            connection.executemany(
+                "INSERT INTO predictions (ts, source, camera, predicted_class, confidence) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            connection.executemany(
+                """INSERT INTO hourly_rollup VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (hour, camera, source, predicted_class, confidence_bin) DO UPDATE SET
+                       count = count + excluded.count,
+                       confidence_sum = confidence_sum + excluded.confidence_sum""",
+                [(*key, count, total) for key, (count, total) in rollup.items()]
+            )
+
+    def _filters(self, start: float, end: float, camera: Optional[str], source: Optional[str]):
+        clauses, params = ["hour >= ?", "hour < ?"], [int(start // 3600), int(-(-end // 3600))]
+        if camera is not None:
+            clauses.append("camera = ?")
+            params.append(camera)
+        if source is not None:
+            clauses.append("source = ?")
+            params.append(source)
+        return " AND ".join(clauses), params
+
+    def class_histogram(self, start: float, end: float, bucket: str = "hour",
+                        camera: Optional[str] = None, source: Optional[str] = None) -> List[Dict]:
+        """Prediction counts per class in hourly or daily buckets (UTC) between two timestamps"""
+        hours_per_bucket = BUCKET_SECONDS[bucket] // 3600
+        where, params = self._filters(start, end, camera, source)
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"""SELECT (hour / ?) * ? AS bucket, predicted_class, SUM(count), SUM(confidence_sum)
+                    FROM hourly_rollup WHERE {where}
+                    GROUP BY bucket, predicted_class ORDER BY bucket""",
+                [hours_per_bucket, hours_per_bucket, *params]
+            ).fetchall()
+        return [{
+            "bucket_start": bucket_hour * 3600,
+            "predicted_class": predicted_class,
+            "count": count,
+            "mean_confidence": total / count
+        } for bucket_hour, predicted_class, count, total in rows]
+
+    def confidence_distribution(self, start: float, end: float, camera: Optional[str] = None,
+                                source: Optional[str] = None,
+                                predicted_class: Optional[str] = None) -> Dict[str, List[int]]:
+        """Histogram of confidences in ``CONFIDENCE_BINS`` equal-width bins, per class"""
+        where, params = self._filters(start, end, camera, source)
+        if predicted_class is not None:
+            where += " AND predicted_class = ?"
+            params.append(predicted_class)
+        with self._read_lock:
+            rows = self._reader.execute(
+                f"""SELECT predicted_class, confidence_bin, SUM(count) FROM hourly_rollup
+                    WHERE {where} GROUP BY predicted_class, confidence_bin""",
+                params
+            ).fetchall()
+        histograms = defaultdict(lambda: [0] * CONFIDENCE_BINS)
+        for name, confidence_bin, count in rows:
+            histograms[name][confidence_bin] = count
+        return dict(histograms)
@@ -0,0 +1,168 @@
+import os
+import json
+import math
+import time
+import argparse
+import logging
+import cv2
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPU quota of the container in cores, from cgroup v2 or v1, or None when unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+def available_cpus() -> List[int]:
+    """CPU ids this process may run on, trimmed to the cgroup quota"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cpus = cpus[:max(1, math.ceil(quota))]
+    return cpus
+
+def plan_threads(cpus: List[int], io_fraction: float = 0.25) -> Dict:
+    """Split the available cores between the inference engine and decode/encode workers"""
+    io_count = max(1, round(len(cpus) * io_fraction)) if len(cpus) > 2 else 0
+    inference_cpus, io_cpus = cpus[:len(cpus) - io_count], cpus[len(cpus) - io_count:]
+    return {
+        "inference_threads": len(inference_cpus),
+        "interop_threads": 1,
+        "io_threads": max(1, len(io_cpus)),
+        "inference_cpus": inference_cpus,
+        # With too few cores to split, decode/encode shares the inference cores
+        "io_cpus": io_cpus or inference_cpus,
+        "batch_size": None  # only known after auto-tuning
+    }
+
+def load_plan(tuning_path: str, io_fraction: float = 0.25) -> Dict:
+    """Start from a plan for this box and overlay the auto-tuned values if they exist"""
+    plan = plan_threads(available_cpus(), io_fraction)
+    if os.path.exists(tuning_path):
+        with open(tuning_path) as f:
+            tuned = json.load(f)
+        plan["inference_threads"] = min(tuned["inference_threads"], len(plan["inference_cpus"]))
+        plan["batch_size"] = tuned["batch_size"]
+    return plan
+
+def _pin_current_thread(cpus: List[int]):
+    if hasattr(os, "sched_setaffinity") and cpus:
+        os.sched_setaffinity(0, cpus)
+
+def apply_plan(plan: Dict):
+    """Configure PyTorch and OpenCV thread pools; call before the first torch operation
+
+    Pinning is left to the executors' initializers: the inference worker pins itself, so
+    the OpenMP team it creates inherits its cores, and the calling thread (the event
+    loop) stays unpinned.
+    """
+    torch.set_num_threads(plan["inference_threads"])
+    try:
+        torch.set_num_interop_threads(plan["interop_threads"])
+    except RuntimeError:
+        logger.warning("Inter-op thread pool already started; keeping its current size")
+    cv2.setNumThreads(plan["io_threads"])
+    logger.info(
+        f"Runtime plan: {plan['inference_threads']} inference threads on cpus {plan['inference_cpus']}, "
+        f"{plan['io_threads']} decode/encode threads on cpus {plan['io_cpus']}, batch size {plan['batch_size']}"
+    )
+
+def create_inference_executor(plan: Dict, pin: bool = False) -> ThreadPoolExecutor:
+    """Single worker for all inference, so only one OpenMP team of inference threads exists"""
+    return ThreadPoolExecutor(
+        max_workers=1,
+        thread_name_prefix="inference",
+        initializer=_pin_current_thread if pin else None,
+        initargs=(plan["inference_cpus"],) if pin else ()
+    )
+
+def create_io_executor(plan: Dict, pin: bool = False) -> ThreadPoolExecutor:
+    """Thread pool for decode/encode work, sized (and optionally pinned) to the io cores"""
+    return ThreadPoolExecutor(
+        max_workers=plan["io_threads"],
+        thread_name_prefix="io",
+        initializer=_pin_current_thread if pin else None,
+        initargs=(plan["io_cpus"],) if pin else ()
+    )
+
+def autotune(
+    model: torch.nn.Module,
+    thread_counts: List[int],
+    batch_sizes: List[int],
+    iterations: int = 5,
+    max_latency_ms: Optional[float] = None
+) -> Tuple[Dict, List[Dict]]:
+    """Benchmark thread/batch combinations and return the highest-throughput one within the SLO"""
+    results = []
+    with torch.no_grad():
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            for batch_size in batch_sizes:
+                batch = torch.randn(batch_size, 3, 224, 224)
+                model(batch)  # warm-up
+                latencies = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    model(batch)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                row = {
+                    "inference_threads": threads,
+                    "batch_size": batch_size,
+                    "images_per_second": batch_size * 1000 / float(np.median(latencies)),
+                    "p95_batch_latency_ms": float(np.percentile(latencies, 95))
+                }
+                results.append(row)
+                print(f"threads {threads:>2}  batch {batch_size:>2}  "
+                      f"{row['images_per_second']:.1f} img/s  p95 {row['p95_batch_latency_ms']:.0f}ms")
+
+    eligible = [r for r in results if max_latency_ms is None or r["p95_batch_latency_ms"] <= max_latency_ms]
+    if not eligible:
+        raise ValueError(f"No combination meets the {max_latency_ms}ms latency limit")
+    return max(eligible, key=lambda r: r["images_per_second"]), results
+
+if __name__ == "__main__":
+    from model import CATEGORIES, EfficientNetB4Custom
+
+    parser = argparse.ArgumentParser(description="Inspect or auto-tune the inference thread layout")
+    parser.add_argument("command", choices=["show", "autotune"])
+    parser.add_argument("--output", default="runtime_tuning.json")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--max-latency-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    plan = plan_threads(cpus)
+    if args.command == "show":
+        print(json.dumps({"cgroup_cpu_limit": _cgroup_cpu_limit(), "available_cpus": cpus, "plan": plan}, indent=2))
+    else:
+        # Latency does not depend on the weights, so a randomly initialized model is enough
+        model = EfficientNetB4Custom(num_classes=len(CATEGORIES), pretrained=False).eval()
+        thread_counts = sorted({t for t in (1, 2, 4, 8, 16, 32) if t < plan["inference_threads"]}
+                               | {plan["inference_threads"]})
+        best, results = autotune(model, thread_counts, args.batch_sizes, args.iterations, args.max_latency_ms)
+        with open(args.output, "w") as f:
+            json.dump({**best, "results": results}, f, indent=2)
+        print(f"Best: {best['inference_threads']} threads, batch {best['batch_size']} -> saved to {args.output}")
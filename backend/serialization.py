@@ -0,0 +1,77 @@
+import gzip
+import json
+import base64
+from typing import Any, Dict, Optional, Tuple
+from starlette.responses import Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+CBOR_TYPE = "application/cbor"
+MIN_COMPRESS_SIZE = 1024  # smaller bodies are not worth the compression overhead
+
+def to_jsonable(value: Any) -> Any:
+    """Replace raw JPEG bytes with data URLs so the result can be sent as JSON"""
+    if isinstance(value, (bytes, bytearray)):
+        return f"data:image/jpeg;base64,{base64.b64encode(value).decode('utf-8')}"
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_jsonable(item) for item in value]
+    return value
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Pick "msgpack", "cbor" or "json" from an Accept header (or a format name)"""
+    accept = (accept or "").lower()
+    if msgpack is not None and (any(t in accept for t in MSGPACK_TYPES) or accept == "msgpack"):
+        return "msgpack"
+    if cbor2 is not None and (CBOR_TYPE in accept or accept == "cbor"):
+        return "cbor"
+    return "json"
+
+def serialize(result: Dict, fmt: str) -> Tuple[bytes, str]:
+    """Encode a result in the given format; binary formats keep images as raw bytes"""
+    if fmt == "msgpack":
+        return msgpack.packb(result, use_bin_type=True), MSGPACK_TYPES[0]
+    if fmt == "cbor":
+        return cbor2.dumps(result), CBOR_TYPE
+    body = json.dumps(to_jsonable(result), separators=(",", ":")).encode("utf-8")
+    return body, "application/json"
+
+def _compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    encodings = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if brotli is not None and "br" in encodings:
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in encodings:
+        return gzip.compress(body, compresslevel=5), "gzip"
+    return body, None
+
+def encode_response(result: Dict, headers, status_code: int = 200) -> Response:
+    """Build a response in the format and content encoding the client asked for
+
+    Binary formats already carry images as raw JPEG bytes, which do not compress further,
+    so only JSON bodies are gzip/brotli encoded.
+    """
+    fmt = negotiate_format(headers.get("accept"))
+    body, media_type = serialize(result, fmt)
+    response_headers = {"Vary": "Accept, Accept-Encoding"}
+    if fmt == "json":
+        body, encoding = _compress(body, headers.get("accept-encoding", ""))
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=response_headers)
@@ -0,0 +1,275 @@
+import os
+import time
+import uuid
+import asyncio
+import argparse
+import logging
+import threading
+import cv2
+import numpy as np
+import torch
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from preprocessing import prepare_image
+
+logger = logging.getLogger(__name__)
+
+NETWORK_SCHEMES = {"rtsp", "http", "https"}
+
+def check_source_url(url: str, files_dir: str) -> str:
+    """Return the URL to open for a client-supplied source, or raise ValueError
+
+    Only RTSP/HTTP(S) URLs and files inside ``files_dir`` are accepted, so clients cannot
+    make OpenCV open arbitrary paths, devices or GStreamer pipelines.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme in NETWORK_SCHEMES:
+        if not parsed.netloc or any(c.isspace() for c in url):
+            raise ValueError(f"Invalid stream URL: {url}")
+        return url
+    if parsed.scheme:
+        raise ValueError(f"Unsupported stream scheme: {parsed.scheme}")
+
+    root = os.path.realpath(files_dir)
+    path = os.path.realpath(os.path.join(root, url))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        raise ValueError(f"Local sources must be files in {files_dir}")
+    return path
+
+class StreamSource(threading.Thread):
+    """Decodes one RTSP/HTTP/file source in a dedicated thread, keeping only the newest frame
+
+    Local files are paced to their native frame rate (and optionally looped) so they behave
+    like a live camera when used as a stand-in.
+    """
+    def __init__(self, source_id: str, url: str, loop: bool = False, reconnect_delay: float = 2.0):
+        super(StreamSource, self).__init__(name=f"stream-{source_id}", daemon=True)
+        self.source_id = source_id
+        self.url = url
+        self.loop = loop
+        self.reconnect_delay = reconnect_delay
+        self.is_file = os.path.exists(url)
+        self.frames_decoded = 0
+        self.connected = False
+        self._frame = None
+        self._frame_id = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            # FFmpeg only: other backends (GStreamer) would also accept pipeline descriptions
+            cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG)
+            if not cap.isOpened():
+                logger.warning(f"Could not open stream {self.source_id} ({self.url}); retrying")
+                self._stopped.wait(self.reconnect_delay)
+                continue
+
+            self.connected = True
+            frame_period = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25.0) if self.is_file else 0.0
+            next_frame_at = time.monotonic()
+            while not self._stopped.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    if self.is_file and self.loop:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                with self._lock:
+                    self._frame = frame
+                    self._frame_id += 1
+                self.frames_decoded += 1
+
+                if frame_period:
+                    next_frame_at += frame_period
+                    self._stopped.wait(max(0.0, next_frame_at - time.monotonic()))
+
+            cap.release()
+            self.connected = False
+            if self.is_file and not self.loop:
+                break
+            self._stopped.wait(self.reconnect_delay)
+
+    def latest(self) -> Tuple[int, Optional[np.ndarray]]:
+        """Return (frame id, frame) of the newest decoded frame"""
+        with self._lock:
+            return self._frame_id, self._frame
+
+    def stop(self):
+        self._stopped.set()
+
+class IngestionWorker:
+    """Samples the newest frame of every source, classifies them in batches and publishes results"""
+    def __init__(
+        self,
+        predict_func: Callable[[List[np.ndarray]], torch.Tensor],
+        categories: List[str],
+        sample_interval: float = 0.5,
+        max_batch_size: int = 16,
+        on_result: Optional[Callable[[Dict], None]] = None
+    ):
+        self.predict_func = predict_func
+        self.on_result = on_result
+        self.categories = categories
+        self.sample_interval = sample_interval
+        self.max_batch_size = max_batch_size
+        self.sources: Dict[str, StreamSource] = {}
+        self.latest_results: Dict[str, Dict] = {}
+        self._inferred_frame_ids: Dict[str, int] = {}
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add_source(self, url: str, source_id: Optional[str] = None, loop: bool = False) -> str:
+        source_id = source_id or uuid.uuid4().hex[:8]
+        source = StreamSource(source_id, url, loop=loop)
+        with self._lock:
+            if source_id in self.sources:
+                raise ValueError(f"Stream {source_id} already exists")
+            self.sources[source_id] = source
+        source.start()
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="ingestion-worker", daemon=True)
+            self._thread.start()
+        return source_id
+
+    def remove_source(self, source_id: str):
+        with self._lock:
+            source = self.sources.pop(source_id)
+            self.latest_results.pop(source_id, None)
+            self._inferred_frame_ids.pop(source_id, None)
+            subscribers = self._subscribers.pop(source_id, ())
+        source.stop()
+        # None tells subscribers the stream has ended
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put_latest, queue, None)
+            except RuntimeError:
+                pass
+
+    def stop(self):
+        self._stopped.set()
+        for source_id in list(self.sources):
+            self.remove_source(source_id)
+
+    def subscribe(self, source_id: str) -> asyncio.Queue:
+        """Register an asyncio queue receiving this source's results, then None once it is removed
+
+        Call from the event loop.
+        """
+        queue = asyncio.Queue(maxsize=1)
+        with self._lock:
+            if source_id not in self.sources:
+                raise KeyError(source_id)
+            self._subscribers.setdefault(source_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, source_id: str, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.get(source_id, set()).discard((asyncio.get_running_loop(), queue))
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            sources = list(self.sources.values())
+        return [{
+            "source_id": source.source_id,
+            "url": source.url,
+            "connected": source.connected,
+            "frames_decoded": source.frames_decoded,
+            "latest_result": self.latest_results.get(source.source_id)
+        } for source in sources]
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+
+            # Only frames the sources have produced since the last inference are worth running
+            with self._lock:
+                sources = list(self.sources.values())
+            frames = []
+            for source in sources:
+                frame_id, frame = source.latest()
+                if frame is not None and frame_id != self._inferred_frame_ids.get(source.source_id):
+                    frames.append((source.source_id, frame_id, frame))
+
+            for start in range(0, len(frames), self.max_batch_size):
+                chunk = frames[start:start + self.max_batch_size]
+                try:
+                    self._infer(chunk)
+                except Exception as e:
+                    logger.error(f"Stream batch inference failed: {e}")
+
+            self._stopped.wait(max(0.0, self.sample_interval - (time.monotonic() - started)))
+
+    def _infer(self, chunk: List[Tuple[str, int, np.ndarray]]):
+        start = time.monotonic()
+        probabilities = self.predict_func([prepare_image(frame) for _, _, frame in chunk])
+        confidences, indices = probabilities.max(dim=1)
+        latency_ms = (time.monotonic() - start) * 1000
+
+        for (source_id, frame_id, _), confidence, index in zip(chunk, confidences.tolist(), indices.tolist()):
+            result = {
+                "source_id": source_id,
+                "frame_id": frame_id,
+                "predicted_class": self.categories[index],
+                "confidence": confidence,
+                "latency_ms": latency_ms,
+                "timestamp": datetime.now().isoformat()
+            }
+            with self._lock:
+                if source_id not in self.sources:
+                    continue
+                self._inferred_frame_ids[source_id] = frame_id
+                self.latest_results[source_id] = result
+                subscribers = list(self._subscribers.get(source_id, ()))
+            if self.on_result is not None:
+                self.on_result(result)
+            for loop, queue in subscribers:
+                try:
+                    loop.call_soon_threadsafe(_put_latest, queue, result)
+                except RuntimeError:
+                    pass  # the subscriber's event loop has shut down
+
+def _put_latest(queue: asyncio.Queue, item):
+    """Replace whatever the subscriber has not read yet with the newest result"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(item)
+
+if __name__ == "__main__":
+    from model import CATEGORIES, EfficientNetB4Custom, load_model
+    from preprocessing import to_input_batch
+
+    parser = argparse.ArgumentParser(description="Classify RTSP/HTTP/file streams locally")
+    parser.add_argument("sources", nargs="+", help="Stream URLs or local video files")
+    parser.add_argument("--model", default="TrashNet_Model.pth")
+    parser.add_argument("--interval", type=float, default=0.5, help="Seconds between samples")
+    parser.add_argument("--loop", action="store_true", help="Loop local files")
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_model(EfficientNetB4Custom, args.model, device)
+
+    def predict(images):
+        with torch.no_grad():
+            return torch.softmax(model(to_input_batch(images, device)), dim=1)
+
+    worker = IngestionWorker(predict, CATEGORIES, sample_interval=args.interval)
+    for url in args.sources:
+        worker.add_source(url, loop=args.loop)
+
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        time.sleep(args.interval)
+        for row in worker.stats():
+            result = row["latest_result"]
+            if result:
+                print(f"{row['source_id']} frame {result['frame_id']}: "
+                      f"{result['predicted_class']} ({result['confidence']:.1%})")
+    worker.stop()
@@ -0,0 +1,53 @@
+import struct
+import zlib
+import cv2
+import numpy as np
+import pytest
+from decoding import (
+    ImageDecodeError,
+    ImageTooLargeError,
+    decode_image,
+    decode_scale,
+    decode_upload,
+    read_dimensions,
+)
+
+def png_header(width: int, height: int) -> bytes:
+    """A PNG with a valid header claiming the given size and no pixel data"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IEND", b"")
+
+def jpeg(width: int, height: int) -> bytes:
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+def test_dimensions_come_from_the_header():
+    assert read_dimensions(png_header(640, 480)) == (640, 480)
+
+def test_rejects_images_above_the_pixel_limit():
+    with pytest.raises(ImageTooLargeError):
+        decode_image(png_header(8000, 8000), max_pixels=50_000_000)
+
+def test_rejects_decompression_bombs_past_pil_limit():
+    # PIL refuses these headers itself; they must still surface as too large (413), not 500
+    with pytest.raises(ImageTooLargeError):
+        decode_image(png_header(20000, 20000))
+
+def test_undecodable_upload():
+    with pytest.raises(ImageDecodeError) as error:
+        decode_image(b"not an image")
+    assert not isinstance(error.value, ImageTooLargeError)
+
+def test_decode_scale_covers_model_input_and_display():
+    assert decode_scale(12000, 9000) == 8  # 1500x1125 still covers a 1280 display
+    assert decode_scale(4000, 3000) == 2  # 1000px at 1/4 would be smaller than the display
+    assert decode_scale(640, 480) == 1  # small images are displayed at full size
+
+def test_display_is_capped_and_model_input_prepared():
+    model_input, display = decode_upload(jpeg(3000, 2000), display_max_side=1280)
+    assert max(display.shape[:2]) == 1280
+    assert display.shape[1] > display.shape[0]
+    assert model_input.shape == (224, 224, 3)
+    assert model_input.dtype == np.uint8
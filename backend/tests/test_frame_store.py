@@ -0,0 +1,78 @@
+import os
+from frame_store import FrameStore, ResultCache, frame_response
+
+DATA = bytes(range(256)) * 4  # 1024 bytes
+
+def stored(tmp_path, data=DATA, **kwargs):
+    store = FrameStore(str(tmp_path / "frames"), **kwargs)
+    key = store.put(data)
+    return store, key, store.get_path(key)
+
+def test_identical_frames_share_one_file(tmp_path):
+    store, key, _ = stored(tmp_path)
+    assert store.put(DATA) == key
+    assert store.stats()["frames"] == 1
+    assert len(os.listdir(tmp_path / "frames")) == 1
+
+def test_full_response_has_etag_and_immutable_caching(tmp_path):
+    _, key, path = stored(tmp_path)
+    response = frame_response(path, key, {})
+    assert response.status_code == 200
+    assert response.body == DATA
+    assert response.headers["etag"] == f'"{key}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+def test_matching_etag_returns_304(tmp_path):
+    _, key, path = stored(tmp_path)
+    response = frame_response(path, key, {"if-none-match": f'"{key}"'})
+    assert response.status_code == 304
+    assert response.body == b""
+
+def test_byte_ranges(tmp_path):
+    _, key, path = stored(tmp_path)
+    partial = frame_response(path, key, {"range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.body == DATA[10:20]
+    assert partial.headers["content-range"] == f"bytes 10-19/{len(DATA)}"
+
+    suffix = frame_response(path, key, {"range": "bytes=-24"})
+    assert suffix.body == DATA[-24:]
+    open_ended = frame_response(path, key, {"range": "bytes=1000-"})
+    assert open_ended.body == DATA[1000:]
+
+def test_unsatisfiable_range_returns_416(tmp_path):
+    _, key, path = stored(tmp_path)
+    response = frame_response(path, key, {"range": f"bytes={len(DATA)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(DATA)}"
+
+def test_least_recently_used_frames_are_evicted(tmp_path):
+    store = FrameStore(str(tmp_path / "frames"), max_bytes=2 * len(DATA))
+    first = store.put(DATA)
+    second = store.put(DATA[::-1])
+    store.get_path(first)  # first is now more recent than second
+    third = store.put(DATA[1:] + DATA[:1])
+    assert store.contains(first) and store.contains(third)
+    assert not store.contains(second)
+    assert store.get_path(second) is None
+
+def test_store_survives_restart(tmp_path):
+    _, key, _ = stored(tmp_path)
+    reopened = FrameStore(str(tmp_path / "frames"))
+    assert reopened.contains(key)
+
+def test_result_cache_drops_results_whose_frames_were_evicted(tmp_path):
+    store = FrameStore(str(tmp_path / "frames"), max_bytes=len(DATA))
+    cache = ResultCache()
+    key = store.put(DATA)
+    cache_key = ResultCache.key(b"upload", "image", 1)
+    cache.put(cache_key, {"processed_image": key}, [key])
+    assert cache.get(cache_key, store) == {"processed_image": key}
+
+    store.put(DATA[::-1])  # evicts the first frame
+    assert cache.get(cache_key, store) is None
+
+def test_invalid_keys_are_not_served(tmp_path):
+    store, _, _ = stored(tmp_path)
+    assert store.get_path("../../etc/passwd") is None
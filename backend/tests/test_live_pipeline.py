@@ -0,0 +1,109 @@
+import asyncio
+import numpy as np
+import torch
+from live_sessions import LiveConnection, LiveSessionManager
+
+class Disconnect(Exception):
+    pass
+
+def predict(images):
+    return torch.softmax(torch.randn(len(images), 4), dim=1)
+
+def frames(count):
+    rng = np.random.default_rng(0)
+    # Distinct frames, so none is skipped as a duplicate of the previous one
+    return [rng.integers(0, 256, (48, 64, 3), dtype=np.uint8) for _ in range(count)]
+
+def render(image, predicted, confidence, frame_id, inferred):
+    return {"frame_id": frame_id, "inferred": inferred}
+
+def encode(result):
+    return result["frame_id"]
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+def run_connection(messages, render=render, lockstep=True, disconnect_when=None, fail_send_after=None):
+    """Drive a LiveConnection with a fake client and return (sent frame ids, error, session, manager)
+
+    A lockstep client waits for each frame to be answered (or rejected by ``render``) before
+    sending the next; otherwise sends are held until every frame was received. After the
+    last frame the client disconnects once ``disconnect_when(sent)`` holds, or never.
+    """
+    pending = list(messages)
+    sent, rejected = [], []
+    all_received = asyncio.Event()
+
+    async def receive():
+        if lockstep:
+            await wait_until(lambda: len(sent) + len(rejected) >= len(messages) - len(pending))
+        if not pending:
+            all_received.set()
+            await wait_until(lambda: disconnect_when is not None and disconnect_when(sent))
+            raise Disconnect()
+        return pending.pop(0)
+
+    async def send(message):
+        if fail_send_after is not None and len(sent) >= fail_send_after:
+            raise ConnectionResetError("client went away")
+        if not lockstep:
+            await all_received.wait()
+        sent.append(message)
+
+    def tracked_render(image, predicted, confidence, frame_id, inferred):
+        try:
+            return render(image, predicted, confidence, frame_id, inferred)
+        except Exception:
+            rejected.append(frame_id)
+            raise
+
+    async def main():
+        manager = LiveSessionManager(predict)
+        session = manager.open()
+        connection = LiveConnection(manager, session, receive, send, lambda m: m, tracked_render, encode)
+        error = None
+        try:
+            await connection.run()
+        except Exception as e:
+            error = e
+        finally:
+            manager.close(session)
+        # Every stage is stopped once run() returns
+        current = asyncio.current_task()
+        assert [t for t in asyncio.all_tasks() if t is not current and t is not manager._scheduler] == []
+        manager._scheduler.cancel()
+        return error, session, manager
+    error, session, manager = asyncio.run(main())
+    return sent, error, session, manager
+
+def test_disconnect_ends_the_connection_and_cancels_the_stages():
+    sent, error, session, manager = run_connection(frames(5), disconnect_when=lambda sent: len(sent) == 5)
+    assert isinstance(error, Disconnect)
+    assert sent == [0, 1, 2, 3, 4]
+    assert session.frames_received == 5 and session.frames_dropped == 0
+    assert manager.sessions == {}
+
+def test_failed_render_skips_only_that_frame():
+    def flaky_render(image, predicted, confidence, frame_id, inferred):
+        if frame_id == 1:
+            raise ValueError("cannot encode")
+        return render(image, predicted, confidence, frame_id, inferred)
+    sent, error, _, _ = run_connection(frames(4), render=flaky_render, disconnect_when=lambda sent: len(sent) == 3)
+    assert isinstance(error, Disconnect)
+    assert sent == [0, 2, 3]
+
+def test_slow_client_drops_oldest_frames_and_ids_identify_replies():
+    sent, error, session, _ = run_connection(
+        frames(30), lockstep=False, disconnect_when=lambda sent: sent[-1:] == [29]
+    )
+    assert isinstance(error, Disconnect)
+    assert sent[0] == 0 and sent[-1] == 29
+    assert sent == sorted(set(sent))
+    assert session.frames_dropped == 30 - len(sent) > 0
+
+def test_failed_send_ends_the_connection():
+    sent, error, _, manager = run_connection(frames(10), fail_send_after=2)
+    assert isinstance(error, ConnectionResetError)
+    assert sent == [0, 1]
+    assert manager.sessions == {}
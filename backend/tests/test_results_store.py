@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+from results_store import CONFIDENCE_BINS, ResultsStore
+
+HOUR = 3600
+DAY_START = datetime(2024, 3, 1, tzinfo=timezone.utc).timestamp()
+
+def write(path, rows):
+    """Record rows through the background writer; close() drains the queue"""
+    store = ResultsStore(path, flush_interval=0.05)
+    for row in rows:
+        store.record(*row)
+    store.close()
+    return ResultsStore(path, flush_interval=0.05)
+
+def test_hourly_and_daily_class_histogram(tmp_path):
+    store = write(str(tmp_path / "results.db"), [
+        ("image", "cam1", "plastic", 0.9, DAY_START + 10),
+        ("image", "cam1", "plastic", 0.7, DAY_START + 20),
+        ("image", "cam1", "glass", 0.5, DAY_START + HOUR + 5),
+        ("live", "cam2", "plastic", 0.8, DAY_START + 2 * HOUR),
+    ])
+    try:
+        hourly = store.class_histogram(DAY_START, DAY_START + 3 * HOUR, "hour")
+        assert [(row["bucket_start"], row["predicted_class"], row["count"]) for row in hourly] == [
+            (DAY_START, "plastic", 2),
+            (DAY_START + HOUR, "glass", 1),
+            (DAY_START + 2 * HOUR, "plastic", 1),
+        ]
+        assert hourly[0]["mean_confidence"] == 0.8
+
+        daily = store.class_histogram(DAY_START, DAY_START + 3 * HOUR, "day")
+        assert {row["predicted_class"]: row["count"] for row in daily} == {"plastic": 3, "glass": 1}
+        assert all(row["bucket_start"] == DAY_START for row in daily)
+    finally:
+        store.close()
+
+def test_filters_by_camera_source_and_time(tmp_path):
+    store = write(str(tmp_path / "results.db"), [
+        ("image", "cam1", "plastic", 0.9, DAY_START),
+        ("live", "cam2", "plastic", 0.9, DAY_START),
+        ("image", "cam1", "metal", 0.9, DAY_START + 5 * HOUR),
+    ])
+    try:
+        by_camera = store.class_histogram(DAY_START, DAY_START + HOUR, camera="cam2")
+        assert [(row["predicted_class"], row["count"]) for row in by_camera] == [("plastic", 1)]
+        by_source = store.class_histogram(DAY_START, DAY_START + 6 * HOUR, source="image")
+        assert sum(row["count"] for row in by_source) == 2
+        # The window ends before the metal prediction's hour
+        in_window = store.class_histogram(DAY_START, DAY_START + 2 * HOUR)
+        assert "metal" not in {row["predicted_class"] for row in in_window}
+    finally:
+        store.close()
+
+def test_confidence_distribution_bins(tmp_path):
+    store = write(str(tmp_path / "results.db"), [
+        ("image", "", "paper", 0.05, DAY_START),
+        ("image", "", "paper", 0.55, DAY_START),
+        ("image", "", "paper", 1.0, DAY_START),  # the top edge falls in the last bin
+        ("image", "", "trash", 0.55, DAY_START),
+    ])
+    try:
+        histograms = store.confidence_distribution(DAY_START, DAY_START + HOUR)
+        assert len(histograms["paper"]) == CONFIDENCE_BINS
+        assert histograms["paper"][0] == 1
+        assert histograms["paper"][5] == 1
+        assert histograms["paper"][CONFIDENCE_BINS - 1] == 1
+        only_trash = store.confidence_distribution(DAY_START, DAY_START + HOUR, predicted_class="trash")
+        assert list(only_trash) == ["trash"]
+    finally:
+        store.close()
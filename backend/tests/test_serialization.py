@@ -0,0 +1,58 @@
+import gzip
+import json
+import pytest
+from serialization import encode_response, negotiate_format, serialize
+
+JPEG = b"\xff\xd8\xff\xe0fake-jpeg"
+
+def test_negotiate_format():
+    assert negotiate_format(None) == "json"
+    assert negotiate_format("text/html,*/*") == "json"
+    assert negotiate_format("json") == "json"
+
+def test_negotiate_msgpack():
+    pytest.importorskip("msgpack")
+    assert negotiate_format("application/msgpack") == "msgpack"
+    assert negotiate_format("application/x-msgpack;q=0.9") == "msgpack"
+    assert negotiate_format("msgpack") == "msgpack"
+
+def test_negotiate_cbor():
+    pytest.importorskip("cbor2")
+    assert negotiate_format("application/cbor") == "cbor"
+    assert negotiate_format("cbor") == "cbor"
+
+def test_json_turns_images_into_data_urls():
+    body, media_type = serialize({"image": JPEG, "frames": [{"thumbnail": JPEG}]}, "json")
+    decoded = json.loads(body)
+    assert media_type == "application/json"
+    assert decoded["image"].startswith("data:image/jpeg;base64,")
+    assert decoded["frames"][0]["thumbnail"] == decoded["image"]
+
+def test_binary_formats_keep_raw_bytes():
+    msgpack = pytest.importorskip("msgpack")
+    body, media_type = serialize({"image": JPEG}, "msgpack")
+    assert media_type == "application/msgpack"
+    assert msgpack.unpackb(body, raw=False)["image"] == JPEG
+
+def test_large_json_is_compressed_per_accept_encoding():
+    result = {"text": "x" * 5000}
+    response = encode_response(result, {"accept": "application/json", "accept-encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+    assert json.loads(gzip.decompress(response.body)) == result
+
+def test_brotli_preferred_when_available():
+    brotli = pytest.importorskip("brotli")
+    result = {"text": "x" * 5000}
+    response = encode_response(result, {"accept-encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert json.loads(brotli.decompress(response.body)) == result
+
+def test_small_and_binary_bodies_are_not_compressed():
+    small = encode_response({"status": "success"}, {"accept-encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    pytest.importorskip("msgpack")
+    binary = encode_response({"image": JPEG * 500}, {"accept": "application/msgpack", "accept-encoding": "gzip"})
+    assert binary.media_type == "application/msgpack"
+    assert "content-encoding" not in binary.headers
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import uuid
+import itertools
+import threading
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+# Current request/frame trace as (trace id, viewer row); None outside a trace
+_current = ContextVar("trace", default=None)
+_NULL_SPAN = nullcontext()
+_tracer = None
+
+class Tracer:
+    """Appends spans to a Chrome trace-event file (open it in Perfetto or chrome://tracing)
+
+    Uses the JSON array format without the closing bracket, which the viewers accept,
+    so events can be streamed to disk. Each trace gets its own row (tid) in the viewer.
+    """
+    def __init__(self, path: str, flush_every: int = 256):
+        self.path = path
+        self.flush_every = flush_every
+        self.pid = os.getpid()
+        self._rows = itertools.count(1)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+        if self._file.tell() == 0:
+            self._file.write("[\n")
+
+    def next_row(self) -> int:
+        return next(self._rows)
+
+    def add(self, name: str, start: float, end: float, trace_id: str, row: int, **args):
+        """Record a span from two time.monotonic() readings"""
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": int((end - start) * 1e6),
+            "pid": self.pid,
+            "tid": row,
+            "args": {"trace_id": trace_id, **args}
+        }
+        line = json.dumps(event, separators=(",", ":")) + ",\n"
+        with self._lock:
+            self._file.write(line)
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            self._file.close()
+
+class _Span:
+    __slots__ = ("name", "args", "trace", "start")
+
+    def __init__(self, name: str, trace, args):
+        self.name = name
+        self.trace = trace
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        _tracer.add(self.name, self.start, time.monotonic(), *self.trace, **self.args)
+        return False
+
+def enable(path: str) -> Tracer:
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+def disable():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+    _tracer = None
+
+def enabled() -> bool:
+    return _tracer is not None
+
+def start_trace(trace_id: Optional[str] = None) -> Optional[str]:
+    """Begin a trace in the current context and return its id; no-op while disabled"""
+    if _tracer is None:
+        return None
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    _current.set((trace_id, _tracer.next_row()))
+    return trace_id
+
+def current():
+    """The current trace, to hand to another task with ``resume``"""
+    return _current.get()
+
+def resume(trace):
+    """Continue a trace captured with ``current`` in this task"""
+    _current.set(trace)
+
+def span(name: str, **args):
+    """Context manager timing a step of the current trace; a shared no-op when disabled"""
+    if _tracer is None:
+        return _NULL_SPAN
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(name, trace, args)
+
+def record(name: str, start: float, end: float, **args):
+    """Add a span measured elsewhere (e.g. on a batching thread) to the current trace"""
+    if _tracer is None:
+        return
+    trace = _current.get()
+    if trace is not None:
+        _tracer.add(name, start, end, *trace, **args)
@@ -0,0 +1,92 @@
+import time
+import torch
+import torch.nn.functional as F
+from typing import Callable, Optional
+
+def _hflip(x: torch.Tensor) -> torch.Tensor:
+    return torch.flip(x, dims=[3])
+
+def _vflip(x: torch.Tensor) -> torch.Tensor:
+    return torch.flip(x, dims=[2])
+
+def _center_crop(scale: float) -> Callable[[torch.Tensor], torch.Tensor]:
+    """Crop the central ``scale`` fraction and resize it back to the input size"""
+    def view(x: torch.Tensor) -> torch.Tensor:
+        height, width = x.shape[2:]
+        crop_h, crop_w = int(height * scale), int(width * scale)
+        top, left = (height - crop_h) // 2, (width - crop_w) // 2
+        crop = x[:, :, top:top + crop_h, left:left + crop_w]
+        return F.interpolate(crop, size=(height, width), mode="bilinear", align_corners=False)
+    return view
+
+def _zoom_out(scale: float) -> Callable[[torch.Tensor], torch.Tensor]:
+    """Shrink the image by ``scale`` and pad it back to the input size by edge replication
+
+    Replicating edges needs no knowledge of the input's value range, so the view looks
+    the same for normalized PyTorch inputs and 0-255 TFLite inputs.
+    """
+    def view(x: torch.Tensor) -> torch.Tensor:
+        height, width = x.shape[2:]
+        small_h, small_w = int(height * scale), int(width * scale)
+        small = F.interpolate(x, size=(small_h, small_w), mode="bilinear", align_corners=False)
+        top, left = (height - small_h) // 2, (width - small_w) // 2
+        return F.pad(small, (left, width - small_w - left, top, height - small_h - top), mode="replicate")
+    return view
+
+# Ordered so every prefix is a balanced view set; N views uses the first N
+VIEWS = [
+    ("identity", lambda x: x),
+    ("hflip", _hflip),
+    ("center_crop_85", _center_crop(0.85)),
+    ("vflip", _vflip),
+    ("zoom_out_85", _zoom_out(0.85)),
+    ("hflip_center_crop_85", lambda x: _hflip(_center_crop(0.85)(x))),
+    ("center_crop_70", _center_crop(0.7)),
+    ("hvflip", lambda x: torch.flip(x, dims=[2, 3])),
+]
+MAX_VIEWS = len(VIEWS)
+
+class ViewBudget:
+    """Tracks the measured cost of one image-view and caps the views to fit a latency budget"""
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.view_ms = None
+
+    def views_for(self, requested: int, num_images: int, budget_ms: Optional[float]) -> int:
+        """Largest number of views (at most ``requested``) expected to finish within the budget"""
+        if budget_ms is None or self.view_ms is None:
+            return requested
+        affordable = int(budget_ms // (self.view_ms * num_images))
+        return max(1, min(requested, affordable))
+
+    def record(self, elapsed_ms: float, num_images: int, num_views: int):
+        view_ms = elapsed_ms / (num_images * num_views)
+        if self.view_ms is None:
+            self.view_ms = view_ms
+        else:
+            self.view_ms += self.smoothing * (view_ms - self.view_ms)
+
+def tta_predict(
+    predict_func: Callable[[torch.Tensor], torch.Tensor],
+    batch: torch.Tensor,
+    num_views: int,
+    budget: Optional[ViewBudget] = None,
+    budget_ms: Optional[float] = None
+) -> torch.Tensor:
+    """Average softmax probabilities over augmented views, all run in one batched call
+
+    ``predict_func`` maps an NCHW batch to probabilities. Views are stacked view-major,
+    so the output of the single forward pass reshapes to (views, images, classes).
+    """
+    num_images = len(batch)
+    num_views = min(num_views, MAX_VIEWS)
+    if budget is not None:
+        num_views = budget.views_for(num_views, num_images, budget_ms)
+
+    views = torch.cat([view(batch) for _, view in VIEWS[:num_views]])
+    start = time.perf_counter()
+    probabilities = predict_func(views)
+    if budget is not None:
+        budget.record((time.perf_counter() - start) * 1000, num_images, num_views)
+
+    return probabilities.view(num_views, num_images, -1).mean(dim=0)
@@ -1,11 +1,12 @@
 import cv2
 import numpy as np
 import torch
-from typing import List, Dict
-import base64
-import tempfile
-import os
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime
+from preprocessing import prepare_image
+from frame_store import encode_thumbnail
+from frame_filter import FrameFilter
+from tracing import span
 
 def draw_detection(frame: np.ndarray, class_name: str, confidence: float) -> np.ndarray:
     """Draw detection box and label on frame"""
@@ -55,8 +56,8 @@ def draw_detection(frame: np.ndarray, class_name: str, confidence: float) -> np.
 
     return frame
 
-def process_video(video_path: str, model, preprocess_func, categories: List[str]) -> Dict:
-    """Process video file and return detection results"""
+def _read_samples(video_path: str, frame_filter: Optional[FrameFilter]) -> Tuple[List, int, int]:
+    """Read the sampled (frame number, frame) pairs together with the frame count and fps"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise ValueError("Could not open video file")
@@ -65,85 +66,101 @@ def process_video(video_path: str, model, preprocess_func, categories: List[str]
     fps = int(cap.get(cv2.CAP_PROP_FPS))
     sample_interval = max(1, frame_count // 10)  # Process 10 frames evenly distributed
 
+    # Collect the sampled frames first so they can share one forward pass
+    sampled_frames = []
+    unfiltered_frames = []
+    frame_number = 0
+    looking = False
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        if frame_number % sample_interval == 0:
+            unfiltered_frames.append((frame_number, frame))
+            looking = True
+        if looking and (frame_filter is None or frame_filter.check(frame) is None):
+            sampled_frames.append((frame_number, frame))
+            looking = False
+
+        frame_number += 1
+        if frame_number >= frame_count:
+            break
+
+    cap.release()
+    if not sampled_frames:
+        sampled_frames = unfiltered_frames
+    return sampled_frames, frame_count, fps
+
+def process_video(
+    video_path: str,
+    predict_func: Callable[[List[np.ndarray]], torch.Tensor],
+    categories: List[str],
+    frame_filter: Optional[FrameFilter] = None
+) -> Dict:
+    """Process video file and return detection results
+
+    Sampled frames are classified together in a single call to ``predict_func``,
+    which maps a list of prepared RGB inputs to softmax probabilities. With a
+    ``frame_filter``, a rejected sample is deferred to the next frame in its sampling
+    window that passes; if no frame of the video passes, the plain samples are used.
+    """
+    with span("decode_frames"):
+        sampled_frames, frame_count, fps = _read_samples(video_path, frame_filter)
+
     processed_frames = []
     class_counts = {}
     total_confidence = 0
     processed_count = 0
 
-    # Create temporary directory for processed frames
-    with tempfile.TemporaryDirectory() as temp_dir:
-        frame_number = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            if frame_number % sample_interval == 0:
-                # Process frame
-                processed_frame = frame.copy()
-                
-                # Preprocess for model
-                input_frame = cv2.resize(frame, (224, 224))
-                input_frame = cv2.cvtColor(input_frame, cv2.COLOR_BGR2RGB)
-                input_frame = preprocess_func(input_frame)
-                input_frame = np.expand_dims(input_frame, axis=0)
-
-                # Make prediction
-                input_tensor = torch.from_numpy(input_frame).float().to(next(model.parameters()).device)
-                with torch.no_grad():
-                    outputs = model(input_tensor)
-                    probabilities = torch.nn.functional.softmax(outputs, dim=1)[0]
-                    predicted_idx = torch.argmax(probabilities).item()
-                    predicted_class = categories[predicted_idx]
-                    confidence = float(probabilities[predicted_idx])
-
-                # Update statistics
-                class_counts[predicted_class] = class_counts.get(predicted_class, 0) + 1
-                total_confidence += confidence
-                processed_count += 1
-
-                # Draw detection on frame
-                labeled_frame = draw_detection(processed_frame, predicted_class, confidence)
-
-                # Save frame
-                frame_path = os.path.join(temp_dir, f"frame_{frame_number}.jpg")
-                cv2.imwrite(frame_path, labeled_frame)
-
-                # Convert to base64
-                with open(frame_path, "rb") as img_file:
-                    img_data = base64.b64encode(img_file.read()).decode('utf-8')
-
-                processed_frames.append({
-                    "frame_number": frame_number,
-                    "predicted_class": predicted_class,
-                    "confidence": confidence,
-                    "image": f"data:image/jpeg;base64,{img_data}"
-                })
-
-            frame_number += 1
-            if frame_number >= frame_count:
-                break
-
-        cap.release()
-
-        # Determine dominant class
-        dominant_class = max(class_counts.items(), key=lambda x: x[1])[0]
-        avg_confidence = total_confidence / processed_count if processed_count > 0 else 0
-
-        # Use the last processed frame as the summary image
-        if processed_frames:
-            summary_image = processed_frames[-1]["image"]
-        else:
-            summary_image = None
-
-        return {
-            "status": "success",
-            "predicted_class": dominant_class,
-            "confidence": avg_confidence,
-            "processed_frames": processed_frames,
-            "frame_count": frame_count,
-            "processed_count": processed_count,
-            "fps": fps,
-            "processed_image": summary_image,
-            "timestamp": datetime.now().isoformat()
-        }
+    if sampled_frames:
+        with span("inference", frames=len(sampled_frames)):
+            probabilities = predict_func([prepare_image(frame) for _, frame in sampled_frames])
+        confidences, predicted_indices = probabilities.max(dim=1)
+        confidences = confidences.tolist()
+        predicted_indices = predicted_indices.tolist()
+    else:
+        confidences, predicted_indices = [], []
+
+    with span("render", frames=len(sampled_frames)):
+        for (frame_number, frame), predicted_idx, confidence in zip(
+            sampled_frames, predicted_indices, confidences
+        ):
+            predicted_class = categories[predicted_idx]
+
+            # Update statistics
+            class_counts[predicted_class] = class_counts.get(predicted_class, 0) + 1
+            total_confidence += confidence
+            processed_count += 1
+
+            # Draw detection on frame
+            labeled_frame = draw_detection(frame, predicted_class, confidence)
+
+            # Encode in memory; raw JPEG bytes are base64-encoded only for JSON responses
+            _, buffer = cv2.imencode('.jpg', labeled_frame)
+
+            processed_frames.append({
+                "frame_number": frame_number,
+                "predicted_class": predicted_class,
+                "confidence": confidence,
+                "image": buffer.tobytes(),
+                "thumbnail": encode_thumbnail(labeled_frame)
+            })
+
+    # Determine dominant class
+    dominant_class = max(class_counts.items(), key=lambda x: x[1])[0]
+    avg_confidence = total_confidence / processed_count if processed_count > 0 else 0
+
+    return {
+        "status": "success",
+        "predicted_class": dominant_class,
+        "confidence": avg_confidence,
+        "processed_frames": processed_frames,
+        "frame_count": frame_count,
+        "processed_count": processed_count,
+        "fps": fps,
+        # The last processed frame is the summary image; refer to it instead of repeating it
+        "summary_frame": len(processed_frames) - 1 if processed_frames else None,
+        "filtered_frames": frame_filter.stats() if frame_filter else None,
+        "timestamp": datetime.now().isoformat()
+    }